@@ -52,6 +52,12 @@ st.markdown("""
     <p class="card-p">上传 Excel，按字段拆分</p>
 </a>
 
+<a href="/批量分表" target="_self" class="card">
+    <div class="icon">🗂️</div>
+    <div class="card-h3">批量分表</div>
+    <p class="card-p">多个工作簿一次拆分</p>
+</a>
+
 <a href="/分表工具" target="_self" class="card">
     <div class="icon">🛠️</div>
     <div class="card-h3">更多工具</div>
@@ -0,0 +1,43 @@
+# 比较两次性能测试结果：python bench/compare.py 旧.json 新.json [--threshold 1.2]
+# 任一阶段变慢超过阈值时返回非零，便于在流水线中发现回退
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较两次分表性能测试结果")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=1.2, help="新/旧 耗时比超过此值视为回退")
+    args = parser.parse_args(argv)
+
+    old, new = load(args.baseline), load(args.current)
+    if old.get("params") != new.get("params"):
+        print("! 两次测试参数不同，结果仅供参考", file=sys.stderr)
+
+    regressed = []
+    print(f"{'阶段':<28} {'旧(s)':>9} {'新(s)':>9} {'比值':>7}")
+    for name, stage in new["stages"].items():
+        if name not in old["stages"]:
+            print(f"{name:<28} {'-':>9} {stage['best']:9.3f} {'-':>7}")
+            continue
+        before, after = old["stages"][name]["best"], stage["best"]
+        ratio = after / before if before else float("inf")
+        flag = " ✗" if ratio > args.threshold else ""
+        print(f"{name:<28} {before:9.3f} {after:9.3f} {ratio:7.2f}{flag}")
+        if flag:
+            regressed.append(name)
+    if regressed:
+        print(f"回退: {', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+# 并发会话压力测试：用 Streamlit AppTest 模拟 N 个用户同时在分表页面上传、拆分，
+# 统计吞吐量、分表延迟分位数和进程内存峰值，结果 JSON 可用 bench/compare.py 比较
+#   python bench/load_test.py --sessions 8 --rounds 2 --rows 5000 --groups 50 -o load-result.json
+# 服务端参数照常由环境变量控制，例如 SPLIT_MAX_JOBS=4、SPLIT_CACHE_MB=256；
+# 分组结果缓存默认关闭（SPLIT_MEMO_MB=0），否则第二轮起都是缓存命中，测不到并发分表本身
+import argparse
+import datetime
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+# 直接以脚本运行时也能导入仓库中的 splitter
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 缓存预算在导入 splitter 时读取，须在导入前设置；显式设置了 SPLIT_MEMO_MB 时以其为准
+os.environ.setdefault("SPLIT_MEMO_MB", "0")
+
+import openpyxl  # noqa: E402
+import pandas as pd  # noqa: E402
+import streamlit  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from bench.make_workbook import add_arguments, make_workbook  # noqa: E402
+from bench.run_bench import GROUP_COLUMNS, git_revision  # noqa: E402
+from splitter.cache import CACHE_BUDGET_MB  # noqa: E402
+from splitter.diagnostics import max_rss_mb  # noqa: E402
+from splitter.memo import MEMO_BUDGET_MB  # noqa: E402
+from splitter.session import format_options  # noqa: E402
+
+PAGES = {"v1": os.path.join(ROOT, "pages", "分表工具.py"), "v2": os.path.join(ROOT, "pages", "分表V2.py")}
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# AppTest 每次运行都会替换、再清空进程级的 Runtime 实例，多个会话同时重跑页面会互相破坏，
+# 所以页面重跑逐个进行；分表本身在后台任务线程池中执行，各会话的任务仍然并发
+_run_lock = threading.Lock()
+
+
+def percentile(values, p):
+    """最近秩法分位数，values 为空时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def _radio(at, needle):
+    # 控件标签被页面隐藏，按选项文字找到对应的单选框
+    return next(r for r in at.radio if any(needle in o for o in r.options))
+
+
+def _run(at):
+    with _run_lock:
+        at.run()
+    _check(at)
+
+
+def _check(at):
+    if at.exception:
+        raise RuntimeError("; ".join(str(e.value) for e in at.exception))
+
+
+def prepare_session(page, data, args):
+    """打开页面、上传工作簿并设置好选项，返回 (AppTest, 上传到可点击的耗时)"""
+    start = time.perf_counter()
+    at = AppTest.from_file(page, default_timeout=args.timeout)
+    _run(at)
+    at.file_uploader[0].set_value(("input.xlsx", data, XLSX_TYPE))
+    _run(at)
+    _radio(at, "流式写入").set_value("流式写入 (省内存)" if args.engine == "streaming" else "标准写入")
+    workers = next(s for s in at.selectbox if "ZIP 串行生成" in s.options)
+    workers.set_value(args.workers if args.workers in workers.options else 1)
+    _run(at)
+    at.multiselect[0].set_value(list(at.multiselect[0].options))
+    _run(at)
+    at.multiselect[1].set_value(GROUP_COLUMNS)
+    mode = _radio(at, "单文件")
+    mode.set_value(mode.options[0 if args.mode == "single" else 1])
+    labels = {fmt: label for label, fmt in format_options().items()}
+    _radio(at, "格式:").set_value(labels[args.format])
+    _run(at)
+    return at, time.perf_counter() - start
+
+
+def run_split_round(at, args):
+    """点击开始分表并等待后台任务结束，返回本轮的计时；失败时抛出异常"""
+    button = next(b for b in at.button if "开始分表" in b.label)
+    start = time.perf_counter()
+    button.click()
+    _run(at)
+    job = at.session_state["_job"]
+    # 只观察任务状态，不反复重跑页面，避免测试本身占用分表线程的 CPU
+    while job.active:
+        time.sleep(args.poll)
+    if job.status != "done":
+        raise RuntimeError(f"任务{job.status}: {job.error}")
+    # 再跑一次页面，由进度面板填入结果并显示下载按钮
+    _run(at)
+    if not at.session_state["res"]:
+        raise RuntimeError("任务完成后页面没有结果")
+    return {"latency": job.finished - start, "wait": job.started - start, "split": job.finished - job.started}
+
+
+def run_sessions(workbooks, args):
+    """每个会话一个线程：先全部准备好，再同时开始第一轮分表；返回 (各轮记录, 错误列表, 墙钟耗时)"""
+    records, errors = [], []
+    lock = threading.Lock()
+    ready = threading.Barrier(args.sessions)
+    walls = {}
+
+    def session(i):
+        page = PAGES[args.pages[i % len(args.pages)]]
+        try:
+            at, prepare = prepare_session(page, workbooks[i % len(workbooks)], args)
+        except Exception as e:
+            with lock:
+                errors.append({"session": i, "stage": "prepare", "error": repr(e)})
+            ready.abort()
+            return
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            return
+        with lock:
+            walls.setdefault("start", time.perf_counter())
+        for r in range(args.rounds):
+            try:
+                timing = run_split_round(at, args)
+            except Exception as e:
+                with lock:
+                    errors.append({"session": i, "round": r, "stage": "split", "error": repr(e)})
+                return
+            with lock:
+                records.append(dict(session=i, round=r, page=os.path.basename(page), prepare=prepare, **timing))
+                walls["end"] = time.perf_counter()
+
+    threads = [threading.Thread(target=session, args=(i,), name=f"load-session-{i}") for i in range(args.sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = walls["end"] - walls["start"] if "end" in walls else 0.0
+    return records, errors, wall
+
+
+def summarize(records, wall):
+    summary = {"splits": len(records), "wall_seconds": round(wall, 3),
+               "throughput_per_min": round(len(records) / wall * 60, 2) if wall else None}
+    for key in ("latency", "wait", "split", "prepare"):
+        values = [rec[key] for rec in records]
+        summary[key] = {f"p{p}": round(percentile(values, p), 3) if values else None for p in (50, 95, 99)}
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分表页面并发会话压力测试")
+    add_arguments(parser)
+    parser.add_argument("--input", help="使用已有工作簿（分组列须为「分组」），不生成合成数据")
+    parser.add_argument("--sessions", type=int, default=4, help="同时在线的会话数")
+    parser.add_argument("--rounds", type=int, default=1, help="每个会话连续分表的次数")
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), default=list(PAGES), help="会话依次轮换使用的页面")
+    parser.add_argument("--distinct", action="store_true",
+                        help="每个会话上传不同的工作簿（默认共用一个，测试解析缓存的效果）")
+    parser.add_argument("--mode", choices=["single", "zip"], default="zip", help="单文件 或 ZIP 输出")
+    parser.add_argument("--format", choices=list(format_options().values()), default="styled")
+    parser.add_argument("--engine", choices=["standard", "streaming"], default="standard")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="ZIP 模式的并行进程数")
+    parser.add_argument("--poll", type=float, default=0.05, help="检查任务状态的间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=600, help="单次页面运行的超时（秒）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出每次分表的诊断日志")
+    parser.add_argument("-o", "--output", default="load-result.json", help="结果 JSON 路径")
+    args = parser.parse_args(argv)
+    if not args.verbose:
+        logging.getLogger("splitter.diagnostics").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="split-load-") as tmp:
+        if args.input:
+            paths = [args.input]
+        else:
+            n_books = args.sessions if args.distinct else 1
+            paths = [make_workbook(os.path.join(tmp, f"input{i}.xlsx"), args.rows, args.cols, args.sheets,
+                                   args.groups, not args.no_formats, args.seed + i) for i in range(n_books)]
+        workbooks = []
+        for path in paths:
+            with open(path, "rb") as f:
+                workbooks.append(f.read())
+    print(f"{len(workbooks)} 个工作簿 ({sum(map(len, workbooks)) / 1024:.0f} KB)，{args.sessions} 个会话 × {args.rounds} 轮")
+
+    rss_before = max_rss_mb()
+    records, errors, wall = run_sessions(workbooks, args)
+    summary = summarize(records, wall)
+    summary.update(errors=len(errors), max_rss_mb=max_rss_mb(), max_rss_before_mb=rss_before)
+
+    print(f"  完成 {summary['splits']} 次分表，失败 {len(errors)} 次，用时 {summary['wall_seconds']}s，"
+          f"吞吐量 {summary['throughput_per_min']} 次/分钟")
+    for key, label in (("latency", "延迟 (点击→完成)"), ("wait", "等待 (排队+页面)"), ("split", "分表"),
+                       ("prepare", "上传到就绪")):
+        q = summary[key]
+        print(f"  {label:<18} p50 {q['p50']}s  p95 {q['p95']}s  p99 {q['p99']}s")
+    print(f"  进程内存峰值 {summary['max_rss_mb']} MB（开始前 {rss_before} MB）")
+    for err in errors:
+        print(f"  ! 会话 {err['session']} {err['stage']}: {err['error']}", file=sys.stderr)
+
+    result = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "openpyxl": openpyxl.__version__,
+            "streamlit": streamlit.__version__,
+            "max_jobs": os.environ.get("SPLIT_MAX_JOBS"),
+            "memo_mb": MEMO_BUDGET_MB,
+            "cache_mb": CACHE_BUDGET_MB,
+        },
+        "params": {k: getattr(args, k) for k in ("input", "rows", "cols", "sheets", "groups", "no_formats", "seed",
+                                                 "sessions", "rounds", "pages", "distinct", "mode", "format",
+                                                 "engine", "workers")},
+        "summary": summary,
+        "records": records,
+        "errors": errors,
+        # 与 run_bench 相同的结构，便于用 compare.py 比较两次压测的延迟分位数
+        "stages": {f"{key}.p{p}": {"best": summary[key][f"p{p}"], "runs": [rec[key] for rec in records]}
+                   for key in ("latency", "split") for p in (50, 95, 99) if records},
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"→ {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
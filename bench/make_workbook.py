@@ -0,0 +1,71 @@
+# 生成用于性能测试的合成工作簿：行数、列数、Sheet 数、分组基数、数字格式均可配置
+import argparse
+import datetime
+import random
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+
+# 数据列按顺序轮换使用的类型和数字格式
+COLUMN_KINDS = [
+    ("int", "0"),
+    ("float", "#,##0.00"),
+    ("date", "yyyy-mm-dd"),
+    ("pct", "0.00%"),
+    ("text", None),
+]
+
+
+def _value(kind, rng, row_idx):
+    if kind == "int":
+        return rng.randint(0, 100000)
+    if kind == "float":
+        return round(rng.uniform(0, 10000), 2)
+    if kind == "date":
+        return datetime.datetime(2024, 1, 1) + datetime.timedelta(days=row_idx % 365)
+    if kind == "pct":
+        return round(rng.random(), 4)
+    return f"备注{rng.randint(0, 999)}"
+
+
+def make_workbook(path, rows=1000, cols=8, sheets=1, groups=10, formats=True, seed=0):
+    """写出合成工作簿：第 1 列为分组列（G0001...），其余列轮换数值、日期、百分比、文本"""
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    group_names = [f"G{i:04d}" for i in range(1, groups + 1)]
+    for s in range(sheets):
+        ws = wb.create_sheet(f"Sheet{s + 1}")
+        for c in range(1, cols + 1):
+            ws.column_dimensions[get_column_letter(c)].width = 14
+        ws.append(["分组"] + [f"列{c}" for c in range(2, cols + 1)])
+        kinds = [COLUMN_KINDS[(c - 2) % len(COLUMN_KINDS)] for c in range(2, cols + 1)]
+        for r in range(rows):
+            row = [rng.choice(group_names)]
+            for kind, fmt in kinds:
+                value = _value(kind, rng, r)
+                if formats and fmt:
+                    cell = WriteOnlyCell(ws, value=value)
+                    cell.number_format = fmt
+                    value = cell
+                row.append(value)
+            ws.append(row)
+    wb.save(path)
+    return path
+
+
+def add_arguments(parser):
+    parser.add_argument("--rows", type=int, default=1000, help="每个 Sheet 的数据行数")
+    parser.add_argument("--cols", type=int, default=8, help="列数（含分组列）")
+    parser.add_argument("--sheets", type=int, default=1, help="Sheet 数")
+    parser.add_argument("--groups", type=int, default=10, help="分组基数")
+    parser.add_argument("--no-formats", action="store_true", help="不设置数字格式")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成测试工作簿")
+    parser.add_argument("path")
+    add_arguments(parser)
+    args = parser.parse_args()
+    make_workbook(args.path, args.rows, args.cols, args.sheets, args.groups, not args.no_formats, args.seed)
@@ -0,0 +1,112 @@
+# 回归检查：复现过的缓存和筛选问题，修改 splitter 后运行，全部通过时退出码为 0
+#   python bench/regression.py
+import io
+import os
+import sys
+import zipfile
+
+# 直接以脚本运行时也能导入仓库中的 splitter
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd  # noqa: E402
+from openpyxl import Workbook, load_workbook  # noqa: E402
+
+from splitter.diagnostics import Diagnostics  # noqa: E402
+from splitter.engine import run_split  # noqa: E402
+from splitter.ingest import layout_profile, open_workbook  # noqa: E402
+from splitter.memo import OutputMemo, RunMemo  # noqa: E402
+from splitter.projection import make_view  # noqa: E402
+
+CHECKS = []
+
+
+def check(fn):
+    CHECKS.append(fn)
+    return fn
+
+
+def _sheet_data(df):
+    return {"数据": {"df": df, "layout": layout_profile({}, {}, [], len(df) + 1)}}
+
+
+def _members(data):
+    """ZIP 结果中各 xlsx 成员的数据行 {成员名: [行, ...]}"""
+    members = {}
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        for name in zipf.namelist():
+            ws = load_workbook(io.BytesIO(zipf.read(name)), read_only=True).active
+            members[name] = [row for row in ws.iter_rows(min_row=2, values_only=True)]
+    return members
+
+
+@check
+def regroup_reuses_no_members():
+    """同一来源先按 A 再按 B 分组：分组值相同的 ZIP 成员不能复用前一次分组的结果"""
+    df = pd.DataFrame({"A": [1, 2], "B": [2, 1], "备注": ["a-row", "b-row"]})
+    sheet_data = _sheet_data(df)
+    store = OutputMemo(64 * 2 ** 20)
+    for mode in ("files", "merged"):
+        results = {}
+        for column in ("A", "B"):
+            buf = io.BytesIO()
+            run_split(sheet_data, ["数据"], [column], mode, buf, memo=RunMemo(("regroup", mode), store))
+            results[column] = _members(buf.getvalue())
+        assert results["B"]["2.xlsx"] == [(1, 2, "a-row")], (mode, results["B"])
+        assert results["B"]["1.xlsx"] == [(2, 1, "b-row")], (mode, results["B"])
+
+
+@check
+def blank_cells_filter_alike():
+    """「包含」筛选：空单元格在完整读取（NaN）和按需读取（None）时都不匹配"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "数据"
+    ws.append(["id", "name"])
+    for row in (["a", "banana"], ["b", None], ["c", "cherry"], ["d", "nan"]):
+        ws.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    view = make_view(filters=[("name", "contains", "an")])
+    for lazy in (True, False):
+        df = open_workbook(buf.getvalue(), lazy=lazy).sheets(["数据"], view)["数据"]["df"]
+        assert df["id"].tolist() == ["a", "d"], (lazy, df["id"].tolist())
+
+
+@check
+def shared_views_not_reparsed():
+    """两个会话在同一工作簿上交替使用不同筛选：每个视图只解析一次，不互相挤掉"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "数据"
+    ws.append(["区域", "金额"])
+    for i in range(20):
+        ws.append(["华东" if i % 2 else "华北", i])
+    buf = io.BytesIO()
+    wb.save(buf)
+    views = [make_view(filters=[("区域", "eq", "华东")]), make_view(filters=[("区域", "eq", "华北")])]
+    for lazy in (True, False):
+        book = open_workbook(buf.getvalue(), lazy=lazy)
+        diag = Diagnostics()
+        for _ in range(3):
+            for view in views:
+                assert len(book.sheets(["数据"], view, diag=diag)["数据"]["df"]) == 10
+        stages = {item["stage"]: item["calls"] for item in diag.summary()["stages"]}
+        assert stages.get("df_build" if lazy else "project") == 2, (lazy, stages)
+
+
+def main():
+    failed = 0
+    for fn in CHECKS:
+        try:
+            fn()
+        except Exception as e:
+            failed += 1
+            print(f"✗ {fn.__name__}: {e!r}")
+        else:
+            print(f"✓ {fn.__name__}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# 分阶段计时：读取、构建 DataFrame、分组数量估算、单文件分表、各 ZIP 模式，结果写入 JSON
+#   python bench/run_bench.py --rows 5000 --groups 50 -o bench-result.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# 直接以脚本运行时也能导入仓库中的 splitter
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl  # noqa: E402
+import pandas as pd  # noqa: E402
+from openpyxl import load_workbook  # noqa: E402
+
+from bench.make_workbook import add_arguments, make_workbook  # noqa: E402
+from splitter.engine import collect_groups, estimate_groups, output_ext, run_split  # noqa: E402
+from splitter.planner import plan_split  # noqa: E402
+from splitter.ingest import calamine_available, open_workbook, rows_to_df, sheet_layout  # noqa: E402
+from splitter.writer import parquet_available  # noqa: E402
+
+GROUP_COLUMNS = ["分组"]
+
+
+def timed(fn, repeat, setup=None):
+    """重复执行 repeat 次，返回 (最后一次的结果, 每次耗时)；setup 的返回值传给 fn，不计入耗时"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        result = fn(arg) if setup else fn()
+        runs.append(time.perf_counter() - start)
+    return result, runs
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_stages(path, args, out_dir):
+    """逐阶段计时，返回 {阶段名: [耗时...]}"""
+    stages = {}
+
+    def record(name, fn, setup=None):
+        result, runs = timed(fn, args.repeat, setup)
+        stages[name] = runs
+        print(f"  {name:<28} {min(runs):8.3f}s")
+        return result
+
+    # 完整读取：load_workbook 与构建 DataFrame/格式分开计时
+    wb = record("load.full", lambda: load_workbook(path))
+    record("df_build.full", lambda: {s: (rows_to_df(list(wb[s].values)), sheet_layout(wb[s])) for s in wb.sheetnames})
+    # 按需读取：打开（只读表头）与流式解析分开计时
+    record("load.lazy", lambda: open_workbook(path, lazy=True))
+    record("df_build.lazy", lambda book: book.sheets(book.sheet_names),
+           setup=lambda: open_workbook(path, lazy=True))
+    if calamine_available():
+        record("df_build.calamine", lambda book: book.sheets(book.sheet_names),
+               setup=lambda: open_workbook(path, lazy=True, reader="calamine"))
+    compact = record("df_build.compact", lambda: open_workbook(path, compact=True))
+    print(f"  {'compact saved':<28} {compact.saved_bytes() / 1024 / 1024:8.1f} MB")
+    sheet_data = open_workbook(path).sheets(wb.sheetnames)
+    selected = list(sheet_data)
+
+    record("group_estimate", lambda: estimate_groups(sheet_data, selected, GROUP_COLUMNS))
+    groups = record("group_collect", lambda: collect_groups(sheet_data, selected, GROUP_COLUMNS))
+    # 预演：输出名称、行数和大小估算，页面每次重跑都会计算
+    record("plan.files", lambda: plan_split(sheet_data, selected, GROUP_COLUMNS, "files"))
+
+    # 无样式输出格式（只在标准引擎下计时，它们不区分写入引擎）
+    formats = ["xlsx", "csv"] + (["parquet"] if parquet_available() else [])
+    for fmt in formats:
+        for mode in ("sheets", "files", "merged"):
+            target = os.path.join(out_dir, f"{fmt}-{mode}{output_ext(mode, fmt)}")
+            record(f"split.{mode}.{fmt}",
+                   lambda: run_split(sheet_data, selected, GROUP_COLUMNS, mode, target, workers=args.workers,
+                                     groups=groups if mode == "merged" else None, fmt=fmt))
+
+    for engine in args.engines:
+        streaming = engine == "streaming"
+        for mode, ext in (("sheets", ".xlsx"), ("files", ".zip"), ("merged", ".zip")):
+            target = os.path.join(out_dir, f"{engine}-{mode}{ext}")
+            record(f"split.{mode}.{engine}",
+                   lambda: run_split(sheet_data, selected, GROUP_COLUMNS, mode, target, streaming=streaming,
+                                     workers=args.workers, groups=groups if mode == "merged" else None))
+    return stages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分表各阶段性能测试")
+    add_arguments(parser)
+    parser.add_argument("--input", help="使用已有工作簿（分组列须为「分组」），不生成合成数据")
+    parser.add_argument("--engines", nargs="+", choices=["standard", "streaming"], default=["standard", "streaming"])
+    parser.add_argument("-j", "--workers", type=int, default=1, help="ZIP 模式的并行进程数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段重复次数，比较时取最小值")
+    parser.add_argument("-o", "--output", default="bench-result.json", help="结果 JSON 路径")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="split-bench-") as tmp:
+        path = args.input or make_workbook(os.path.join(tmp, "input.xlsx"), args.rows, args.cols, args.sheets,
+                                           args.groups, not args.no_formats, args.seed)
+        print(f"{path} ({os.path.getsize(path) / 1024:.0f} KB)")
+        stages = run_stages(path, args, tmp)
+
+    result = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "pandas": pd.__version__,
+            "openpyxl": openpyxl.__version__,
+        },
+        "params": {k: getattr(args, k) for k in ("input", "rows", "cols", "sheets", "groups", "no_formats",
+                                                 "seed", "engines", "workers", "repeat")},
+        "stages": {name: {"best": min(runs), "runs": runs} for name, runs in stages.items()},
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"→ {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Font, PatternFill, Alignment
-import zipfile
-import re
+from splitter.batch import common_columns as shared_columns
+from splitter.engine import estimate_groups, output_ext
+from splitter.memo import RunMemo
+from splitter.planner import plan_split
+from splitter.projection import view_source
+from splitter.diagnostics import Diagnostics
+from splitter.session import (advanced_options, cached_workbook, format_options, job_active, parse_diagnostics,
+                              show_job_progress, show_plan, show_result, start_split_job, take_parse_diagnostics,
+                              view_controls)
 
 # --- 1. 页面配置与样式 ---
 st.set_page_config(page_title="智能分表工具", layout="wide")
@@ -56,39 +58,7 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# --- 2. 核心工具函数 ---
-def make_clean_name(prefix, suffix, group_name, sheet_name=""):
-    group_part = "-".join(str(v) for v in group_name if pd.notna(v)) if isinstance(group_name, tuple) else str(group_name)
-    parts = [p.strip() for p in [prefix, group_part, suffix, sheet_name] if p.strip()]
-    name = "-".join(parts)
-    return re.sub(r'[\\/*?:[\]]', '_', name)[:31].strip('_- ') or "结果"
-
-def copy_format_and_write(new_ws, orig_ws, group_df):
-    for col_letter, dim in orig_ws.column_dimensions.items():
-        new_ws.column_dimensions[col_letter].width = dim.width
-    for row_num in range(1, len(group_df) + 2):
-        if row_num in orig_ws.row_dimensions:
-            new_ws.row_dimensions[row_num].height = orig_ws.row_dimensions[row_num].height
-    for r_idx, row in enumerate(dataframe_to_rows(group_df, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            new_ws.cell(row=r_idx, column=c_idx, value=value)
-    
-    max_copy = min(orig_ws.max_row, 100)
-    for orig_row in orig_ws.iter_rows(min_row=1, max_row=max_copy):
-        for orig_cell in orig_row:
-            if orig_cell.number_format != 'General':
-                new_ws.cell(row=orig_cell.row, column=orig_cell.column).number_format = orig_cell.number_format
-    
-    header_fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-    even_fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
-    for cell in new_ws[1]:
-        cell.font, cell.fill, cell.alignment = Font(bold=True), header_fill, Alignment(horizontal="center", vertical="center")
-    for row_idx in range(2, len(group_df) + 2):
-        fill = even_fill if (row_idx % 2 == 0) else PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-        for cell in new_ws[row_idx]:
-            cell.fill, cell.alignment = fill, Alignment(vertical="center")
-
-# --- 3. 界面逻辑 ---
+# --- 2. 界面逻辑 ---
 if "res" not in st.session_state: st.session_state.res = None
 if "show_success" not in st.session_state: st.session_state.show_success = False
 
@@ -99,108 +69,84 @@ if st.session_state.show_success:
 st.markdown("<h2 style='text-align: center; color: #5d5d5d;'>📊 智能分表美化工具</h2>", unsafe_allow_html=True)
 
 uploaded_file = st.file_uploader("upload", type=["xlsx"])
-sheet_data = {}
+# 读取、写入、内存、分片、并行和诊断设置（三个分表页面共用）
+opts = advanced_options()
+lazy, reader, compact, streaming = opts["lazy"], opts["reader"], opts["compact"], opts["streaming"]
+part_rows, part_mb, workers = opts["part_rows"], opts["part_mb"], opts["workers"]
+
+book = None
 if uploaded_file:
     try:
-        wb = load_workbook(uploaded_file, data_only=False)
-        for s_name in wb.sheetnames:
-            ws = wb[s_name]
-            data = list(ws.values)
-            df = pd.DataFrame(data[1:], columns=data[0]) if data else pd.DataFrame()
-            sheet_data[s_name] = {"df": df, "ws": ws}
+        # 解析结果按文件内容缓存，控件交互不会重复解析
+        book = cached_workbook(uploaded_file, lazy=lazy, data_only=False, reader=reader, compact=compact)
     except: st.error("读取失败")
 
-if sheet_data:
+if book and book.sheet_names:
     r2c1, r2c2, r2c3 = st.columns([1.5, 1.5, 1])
     
-    selected_sheets = r2c1.multiselect("S", options=list(sheet_data.keys()), default=list(sheet_data.keys()))
+    selected_sheets = r2c1.multiselect("S", options=book.sheet_names, default=book.sheet_names)
     
-    # 获取选中 Sheet 的共同标题
-    common_columns = []
-    if selected_sheets:
-        list_of_column_sets = [set(sheet_data[s]["df"].columns.tolist()) for s in selected_sheets if not sheet_data[s]["df"].empty]
-        if list_of_column_sets:
-            intersect_cols = set.intersection(*list_of_column_sets)
-            first_sheet_cols = sheet_data[selected_sheets[0]]["df"].columns.tolist()
-            common_columns = [col for col in first_sheet_cols if col in intersect_cols]
+    # 获取选中 Sheet 的共同标题（只用表头，数据等选好输出列和筛选后再解析）
+    common_columns = shared_columns([book], selected_sheets)
 
     group_columns = r2c2.multiselect("C", options=common_columns, placeholder="选择共同关键字列")
-    
-    # 【核心修改点】计算所有选中 Sheet 的分组并集，确保“按照最大的”计算数量
-    all_groups_list = []
-    if group_columns and selected_sheets:
-        unique_groups = set()
-        for s in selected_sheets:
-            df_s = sheet_data[s]["df"]
-            if not df_s.empty:
-                # 提取当前 Sheet 中的分组情况
-                current_groups = df_s[group_columns].dropna().drop_duplicates().values
-                for g in current_groups:
-                    # 转化为元组以便存入 set
-                    unique_groups.add(tuple(g) if len(g) > 1 else g[0])
-        all_groups_list = sorted(list(unique_groups)) # 转换为列表用于后续迭代
-
-    r2c3.metric("预计数量", f"{len(all_groups_list)}")
 
     r3c1, r3c2, r3c3 = st.columns([1.2, 1.4, 1.4])
     output_mode = r3c1.radio("M", ["单文件 (多Sheet拆分)", "多文件 (跨Sheet汇总)"], horizontal=True)
+    # 无样式格式直接写出分组数据，跳过逐单元格的格式复制和美化
+    fmt_options = format_options()
+    fmt = fmt_options[r3c1.radio("F", list(fmt_options), horizontal=True)]
     prefix = r3c2.text_input("P", placeholder="前缀")
     suffix = r3c3.text_input("S", placeholder="后缀")
 
+    # 输出列与行筛选在解析时就生效，未选的列和不满足条件的行不会进入 DataFrame
+    view = view_controls(common_columns, group_columns)
+    try:
+        sheet_data = book.sheets(selected_sheets, view, diag=parse_diagnostics())
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    except:
+        st.error("读取失败")
+        st.stop()
+    if compact and book.saved_bytes():
+        st.caption(f"紧凑内存：已解析的 Sheet 共节省 {book.saved_bytes() / 1024 / 1024:.1f} MB")
+    if view:
+        st.caption(f"筛选后共 {sum(len(item['df']) for item in sheet_data.values())} 行")
+
+    # 【核心修改点】计算所有选中 Sheet 的分组并集，确保“按照最大的”计算数量
+    # 每个 Sheet 的去重结果按 (工作簿, 视图, Sheet, 分组列) 缓存，增减 Sheet 或重跑页面时只计算新增的部分
+    source = view_source(book.cache_key, view)
+    n_groups = estimate_groups(sheet_data, selected_sheets, group_columns, RunMemo(source)) if group_columns and selected_sheets else 0
+
+    r2c3.metric("预计数量", f"{n_groups}")
+
+    # 单文件按 Sheet 逐一拆分；多文件按最大的分组并集跨 Sheet 汇总（分表逻辑见 splitter.engine）
+    mode, res_stem = ("sheets", "分表结果") if "单文件" in output_mode else ("merged", "汇总分表结果")
+    # 预演：列出全部输出名称（重名已处理）并估算大小和内存，超过上限时不允许开始分表
+    plan_ok = True
+    if group_columns and n_groups:
+        plan_ok = show_plan(plan_split(sheet_data, selected_sheets, group_columns, mode, fmt, prefix, suffix, memo=RunMemo(source),
+                                       part_rows=part_rows, part_mb=part_mb, streaming=streaming, workers=workers))
+
     st.markdown("<br>", unsafe_allow_html=True)
     r4c1, r4c2 = st.columns([1, 1])
 
-    if r4c1.button("⚙️ 开始分表", type="primary", use_container_width=True, disabled=not (group_columns and all_groups_list)):
-        with st.spinner("处理中..."):
-            if "单文件" in output_mode:
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    # 单文件模式下，按选中的 Sheet 逐一处理
-                    for s_name in selected_sheets:
-                        item = sheet_data[s_name]
-                        if item["df"].empty: continue
-                        grouped = item["df"].groupby(group_columns, sort=False)
-                        for name, group in grouped:
-                            s_out = make_clean_name(prefix, suffix, name, s_name)
-                            new_ws = writer.book.create_sheet(s_out)
-                            copy_format_and_write(new_ws, item["ws"], group)
-                output.seek(0)
-                st.session_state.res = {"data": output, "name": "分表结果.xlsx"}
-            else:
-                # 多文件模式：按照最大的并集分组，跨 Sheet 汇总
-                zip_buf = BytesIO()
-                with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zipf:
-                    for group_val in all_groups_list:
-                        file_name = f"{make_clean_name(prefix, suffix, group_val)}.xlsx"
-                        excel_out = BytesIO()
-                        with pd.ExcelWriter(excel_out, engine='openpyxl') as writer:
-                            has_data = False
-                            for s_name in selected_sheets:
-                                item = sheet_data[s_name]
-                                df_s = item["df"]
-                                if df_s.empty: continue
-                                
-                                # 构建过滤条件
-                                vals = group_val if isinstance(group_val, tuple) else [group_val]
-                                mask = (df_s[group_columns].astype(str) == [str(v) for v in vals]).all(axis=1)
-                                sub_df = df_s[mask]
-                                
-                                if not sub_df.empty:
-                                    new_ws = writer.book.create_sheet(title=s_name)
-                                    copy_format_and_write(new_ws, item["ws"], sub_df)
-                                    has_data = True
-                            
-                            if "Sheet" in writer.book.sheetnames: del writer.book["Sheet"]
-                        
-                        if has_data:
-                            zipf.writestr(file_name, excel_out.getvalue())
-                zip_buf.seek(0)
-                st.session_state.res = {"data": zip_buf, "name": "汇总分表结果.zip"}
-            
-            st.session_state.show_success = True
-            st.rerun()
-
-    if st.session_state.res:
-
-        r4c2.download_button(label="💾 下载结果", data=st.session_state.res["data"], file_name=st.session_state.res["name"], use_container_width=True)
-
+    if r4c1.button("⚙️ 开始分表", type="primary", use_container_width=True, disabled=not (group_columns and n_groups and plan_ok) or job_active()):
+        res_name = res_stem + output_ext(mode, fmt)
+        # 本次运行的分阶段统计，并入上传/选 Sheet 时的解析耗时
+        diag = Diagnostics(trace_memory=opts["trace_memory"])
+        diag.merge(take_parse_diagnostics())
+        diag.info.update(page="V2", file=uploaded_file.name, size=uploaded_file.size, mode=mode, fmt=fmt, reader=reader, compact=compact, view=view,
+                         engine="streaming" if streaming else "standard", workers=workers)
+        # 分表在后台任务中执行，结果直接写入会话临时目录；完成后由进度面板填入 st.session_state.res
+        start_split_job(res_name, diag, source=source,
+                        sheet_data=sheet_data, selected_sheets=selected_sheets, group_columns=group_columns,
+                        mode=mode, prefix=prefix, suffix=suffix, streaming=streaming, workers=workers, fmt=fmt,
+                        part_rows=part_rows, part_mb=part_mb)
+        st.rerun()
+
+    show_result(r4c2)
+
+# 后台分表任务的进度（任务进行中每秒刷新）
+show_job_progress()
\ No newline at end of file
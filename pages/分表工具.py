@@ -1,11 +1,12 @@
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Font, PatternFill, Alignment
-import zipfile
-import re
+from splitter.engine import estimate_groups, output_ext
+from splitter.memo import RunMemo
+from splitter.planner import plan_split
+from splitter.projection import view_source
+from splitter.diagnostics import Diagnostics
+from splitter.session import (advanced_options, cached_workbook, format_options, job_active, parse_diagnostics,
+                              show_job_progress, show_plan, show_result, start_split_job, take_parse_diagnostics,
+                              view_controls)
 
 # --- 1. 页面配置与莫兰迪风格样式 ---
 st.set_page_config(page_title="分表工具", layout="wide")
@@ -73,54 +74,7 @@ div[data-testid="stToast"] {
     </style>
 """, unsafe_allow_html=True)
 
-# --- 2. 核心逻辑函数 ---
-def make_name(prefix, suffix, group_name, sheet_name=""):
-    if isinstance(group_name, tuple):
-        # 处理多列分组的情况，用“-”连接内容
-        group_part = "-".join(str(v) for v in group_name if pd.notna(v))
-    else:
-        group_part = str(group_name)
-    
-    # 【修改处】移除了列表末尾的 sheet_name
-    parts = [p.strip() for p in [prefix, group_part, suffix] if p.strip()]
-    
-    name = "-".join(parts)
-    # 替换 Windows 系统文件名不允许的非法字符，并限制长度（Excel Sheet名上限为31字符）
-    name = re.sub(r'[\\/*?:[\]]', '_', name)[:31].strip('_- ')
-    
-    return name or "结果"  # 如果名字为空，默认返回“结果”
-
-def copy_format_and_write(new_ws, orig_ws, group_df):
-    for col_letter, dim in orig_ws.column_dimensions.items():
-        new_ws.column_dimensions[col_letter].width = dim.width
-    for row_num in range(1, len(group_df) + 2):
-        if row_num in orig_ws.row_dimensions:
-            new_ws.row_dimensions[row_num].height = orig_ws.row_dimensions[row_num].height
-    for r_idx, row in enumerate(dataframe_to_rows(group_df, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            new_ws.cell(row=r_idx, column=c_idx, value=value)
-    max_copy = min(orig_ws.max_row, 100)
-    for orig_row in orig_ws.iter_rows(min_row=1, max_row=max_copy):
-        for orig_cell in orig_row:
-            if orig_cell.number_format != 'General':
-                new_cell = new_ws.cell(row=orig_cell.row, column=orig_cell.column)
-                new_cell.number_format = orig_cell.number_format
-    
-    # Excel 美化
-    header_font = Font(bold=True)
-    header_fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-    even_fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
-    odd_fill  = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
-
-    for cell in new_ws[1]:
-        cell.font, cell.fill, cell.alignment = header_font, header_fill, Alignment(horizontal="center", vertical="center")
-    total_rows = len(group_df) + 1
-    for row_idx in range(2, total_rows + 1):
-        fill = even_fill if (row_idx % 2 == 0) else odd_fill
-        for cell in new_ws[row_idx]:
-            cell.fill, cell.alignment = fill, Alignment(vertical="center")
-
-# --- 3. 界面逻辑 ---
+# --- 2. 界面逻辑 ---
 # 初始化 Session State
 if "res" not in st.session_state: st.session_state.res = None
 if "show_success" not in st.session_state: st.session_state.show_success = False
@@ -133,81 +87,90 @@ if st.session_state.show_success:
 st.markdown("<h2 style='text-align: center; color: #5d5d5d;'>📊 Excel 分表工具</h2>", unsafe_allow_html=True)
 
 MAX_FILE_SIZE = 50 * 1024 * 1024
+LAZY_MAX_FILE_SIZE = 200 * 1024 * 1024  # 按需读取只解析选中的 Sheet，可放宽上限
 r1c1, r1c2 = st.columns([3, 1])
 uploaded_file = r1c1.file_uploader("upload", type=["xlsx"])
 
-sheet_data = {}
+# 读取、写入、内存、分片、并行和诊断设置（三个分表页面共用）
+opts = advanced_options()
+lazy, reader, compact, streaming = opts["lazy"], opts["reader"], opts["compact"], opts["streaming"]
+part_rows, part_mb, workers = opts["part_rows"], opts["part_mb"], opts["workers"]
+max_size = LAZY_MAX_FILE_SIZE if lazy else MAX_FILE_SIZE
+
+book = None
 if uploaded_file:
-    if uploaded_file.size > MAX_FILE_SIZE:
-        r1c2.error("超过 50MB")
+    if uploaded_file.size > max_size:
+        r1c2.error(f"超过 {max_size // 1024 // 1024}MB")
     else:
         try:
-            wb = load_workbook(uploaded_file, data_only=False)
-            for s_name in wb.sheetnames:
-                ws = wb[s_name]
-                data = list(ws.values)
-                df = pd.DataFrame(data[1:], columns=data[0]) if data else pd.DataFrame()
-                sheet_data[s_name] = {"df": df, "ws": ws}
-            r1c2.success(f"已读取 {len(sheet_data)} 个 Sheet")
+            # 解析结果按文件内容缓存，控件交互不会重复解析
+            book = cached_workbook(uploaded_file, lazy=lazy, data_only=False, reader=reader, compact=compact)
+            r1c2.success(f"已读取 {len(book.sheet_names)} 个 Sheet")
         except:
             r1c2.error("读取失败")
 
-if sheet_data:
+if book and book.sheet_names:
     r2c1, r2c2, r2c3 = st.columns([1.5, 1.5, 1])
-    selected_sheets = r2c1.multiselect("S", options=list(sheet_data.keys()), default=list(sheet_data.keys())[:1])
+    selected_sheets = r2c1.multiselect("S", options=book.sheet_names, default=book.sheet_names[:1])
     
     if selected_sheets:
-        ref_df = sheet_data[selected_sheets[0]]["df"]
-        group_columns = r2c2.multiselect("C", options=ref_df.columns.tolist())
-        n_groups = ref_df[group_columns].dropna().drop_duplicates().shape[0] if group_columns else 0
-        r2c3.metric("预计数量", f"{n_groups} 个")
+        # 分组列取第一个 Sheet 的表头，数据等选好输出列和筛选后再解析
+        ref_columns = book.heads[selected_sheets[0]]
+        group_columns = r2c2.multiselect("C", options=ref_columns)
 
         r3c1, r3c2, r3c3 = st.columns([1.2, 1.4, 1.4])
         output_mode = r3c1.radio("M", ["单文件 (多Sheet)", "多文件 (ZIP)"], horizontal=True)
+        # 无样式格式直接写出分组数据，跳过逐单元格的格式复制和美化
+        fmt_options = format_options()
+        fmt = fmt_options[r3c1.radio("F", list(fmt_options), horizontal=True)]
         prefix = r3c2.text_input("P", placeholder="前缀 (可选)")
         suffix = r3c3.text_input("S", placeholder="后缀 (可选)")
 
+        # 输出列与行筛选在解析时就生效，未选的列和不满足条件的行不会进入 DataFrame
+        view = view_controls(ref_columns, group_columns)
+        try:
+            sheet_data = book.sheets(selected_sheets, view, diag=parse_diagnostics())
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+        except:
+            st.error("读取失败")
+            st.stop()
+        if compact and book.saved_bytes():
+            st.caption(f"紧凑内存：已解析的 Sheet 共节省 {book.saved_bytes() / 1024 / 1024:.1f} MB")
+        if view:
+            st.caption(f"筛选后共 {sum(len(item['df']) for item in sheet_data.values())} 行")
+        source = view_source(book.cache_key, view)
+        n_groups = estimate_groups(sheet_data, selected_sheets[:1], group_columns, RunMemo(source)) if group_columns else 0
+        r2c3.metric("预计数量", f"{n_groups} 个")
+
+        # 单文件写入多个 Sheet；多文件时每组一个工作簿打包为 ZIP（分表逻辑见 splitter.engine）
+        mode = "sheets" if "单文件" in output_mode else "files"
+        # 预演：列出全部输出名称（重名已处理）并估算大小和内存，超过上限时不允许开始分表
+        plan_ok = True
+        if group_columns:
+            plan_ok = show_plan(plan_split(sheet_data, selected_sheets, group_columns, mode, fmt, prefix, suffix, sheet_in_name=False,
+                                           memo=RunMemo(source), part_rows=part_rows, part_mb=part_mb, streaming=streaming,
+                                           workers=workers))
+
         st.markdown("<br>", unsafe_allow_html=True)
         r4c1, r4c2 = st.columns([1, 1])
 
-        if r4c1.button("⚙️ 开始分表", type="primary", use_container_width=True, disabled=not group_columns):
-            with st.spinner("处理中..."):
-                count = 0
-                if "单文件" in output_mode:
-                    output = BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        for s_name in selected_sheets:
-                            item = sheet_data[s_name]
-                            grouped = item["df"].groupby(group_columns, sort=False)
-                            for name, group in grouped:
-                                s_out = make_name(prefix, suffix, name, s_name)
-                                new_ws = writer.book.create_sheet(s_out)
-                                copy_format_and_write(new_ws, item["ws"], group)
-                                count += 1
-                    output.seek(0)
-                    st.session_state.res = {"data": output, "name": "分表结果.xlsx"}
-                else:
-                    zip_buf = BytesIO()
-                    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zipf:
-                        for s_name in selected_sheets:
-                            item = sheet_data[s_name]
-                            grouped = item["df"].groupby(group_columns, sort=False)
-                            for name, group in grouped:
-                                f_base = make_name(prefix, suffix, name, s_name)
-                                buf = BytesIO()
-                                with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-                                    new_ws = writer.book.create_sheet("Sheet1")
-                                    copy_format_and_write(new_ws, item["ws"], group)
-                                buf.seek(0)
-                                zipf.writestr(f"{f_base}.xlsx", buf.getvalue())
-                                count += 1
-                    zip_buf.seek(0)
-                    st.session_state.res = {"data": zip_buf, "name": "分表结果.zip"}
-                
-                # 关键：先标记成功，再执行 rerun
-                st.session_state.show_success = True
-                st.rerun()
-
-        if st.session_state.res:
-
-            r4c2.download_button(label="💾 下载分表结果", data=st.session_state.res["data"], file_name=st.session_state.res["name"], use_container_width=True)
+        if r4c1.button("⚙️ 开始分表", type="primary", use_container_width=True, disabled=not (group_columns and plan_ok) or job_active()):
+            res_name = "分表结果" + output_ext(mode, fmt)
+            # 本次运行的分阶段统计，并入上传/选 Sheet 时的解析耗时
+            diag = Diagnostics(trace_memory=opts["trace_memory"])
+            diag.merge(take_parse_diagnostics())
+            diag.info.update(page="V1", file=uploaded_file.name, size=uploaded_file.size, mode=mode, fmt=fmt, reader=reader, compact=compact, view=view,
+                             engine="streaming" if streaming else "standard", workers=workers)
+            # 分表在后台任务中执行，结果直接写入会话临时目录；完成后由进度面板填入 st.session_state.res
+            start_split_job(res_name, diag, source=source,
+                            sheet_data=sheet_data, selected_sheets=selected_sheets, group_columns=group_columns,
+                            mode=mode, prefix=prefix, suffix=suffix, streaming=streaming, workers=workers, sheet_in_name=False,
+                            fmt=fmt, part_rows=part_rows, part_mb=part_mb)
+            st.rerun()
+
+        show_result(r4c2, "💾 下载分表结果")
+
+# 后台分表任务的进度（任务进行中每秒刷新）
+show_job_progress()
\ No newline at end of file
@@ -0,0 +1,123 @@
+import streamlit as st
+from splitter.batch import batch_ext, common_columns, common_sheets
+from splitter.diagnostics import Diagnostics
+from splitter.session import (advanced_options, cached_workbook, format_options, job_active, show_job_progress,
+                              show_result, start_batch_job, take_parse_diagnostics)
+
+# --- 1. 页面配置与样式 ---
+st.set_page_config(page_title="批量分表工具", layout="wide")
+
+st.markdown("""
+    <style>
+    /* 隐藏右上角的菜单按钮和 GitHub 部署者信息 */
+    #MainMenu {visibility: hidden;}
+    header {visibility: hidden;}
+    footer {visibility: hidden;}
+    .block-container { max-width: 900px !important; margin: 0 auto !important; padding-top: 1.5rem !important; }
+    .stApp { background-color: #ffffff; } 
+    label[data-testid="stWidgetLabel"] { display: none !important; }
+
+    /* 统一组件高度与底色 */
+    div[data-testid="stFileUploader"] section, div[data-testid="stMultiSelect"] > div,
+    div[data-testid="stTextInput"] div[data-baseweb="input"], div[data-testid="stMetric"] {
+        height: 40px !important; min-height: 40px !important;
+        background-color: #ffffff !important; border: 1px solid #d1ccc0 !important; border-radius: 4px !important;
+    }
+
+    /* 紧凑间距 */
+    [data-testid="stVerticalBlock"] > div { margin-bottom: 15px !important; }
+
+    /* 上传框样式 */
+    div[data-testid="stFileUploader"] section { padding: 0px 15px !important; justify-content: flex-start !important; display: flex !important; align-items: center !important; }
+    div[data-testid="stFileUploader"] section > div { display: none; } 
+    div[data-testid="stFileUploader"] section::after { content: "📎 点击或拖拽上传多个 Excel 文件"; color: #a39e93; font-size: 14px; margin-left: 5px; }
+
+    /* 指标卡样式 */
+    div[data-testid="stMetric"] { padding: 0px 15px !important; display: flex !important; align-items: center !important; justify-content: space-between !important; }
+    div[data-testid="stMetricLabel"] { color: #a39e93 !important; font-size: 13px !important; margin: 0 !important; }
+    div[data-testid="stMetricValue"] { color: #5a7d9a !important; font-size: 16px !important; padding: 0 !important; }
+
+    /* 按钮样式 */
+    .stButton button, .stDownloadButton button { height: 40px !important; border-radius: 4px !important; border: none !important; color: white !important; font-weight: 500 !important; }
+    div.stButton > button[kind="primary"] { background-color: #8da4b1 !important; }
+    .stDownloadButton button { background-color: #a7ad9b !important; }
+
+    /* 弹出提示居中 */
+    div[data-testid="stToast"] { 
+        position: fixed !important; top: 50% !important; left: 50% !important; 
+        transform: translate(-50%, -50%) !important; width: 320px !important; 
+        background-color: #ffffff !important; border: 2px solid #a7ad9b !important; 
+        box-shadow: 0 10px 25px rgba(0,0,0,0.1) !important; z-index: 10000 !important; 
+    }
+    div[data-testid="stHorizontalBlock"] { align-items: center !important; }
+    </style>
+""", unsafe_allow_html=True)
+
+# --- 2. 界面逻辑 ---
+if "res" not in st.session_state: st.session_state.res = None
+if "show_success" not in st.session_state: st.session_state.show_success = False
+
+if st.session_state.show_success:
+    st.toast("✅ 分表完成！")
+    st.session_state.show_success = False
+
+st.markdown("<h2 style='text-align: center; color: #5d5d5d;'>🗂️ 批量分表工具</h2>", unsafe_allow_html=True)
+
+# 每月的各区域工作簿格式相同：一次上传全部文件，并发读取、拆分，结果打包为一个 ZIP
+uploaded_files = st.file_uploader("upload", type=["xlsx"], accept_multiple_files=True)
+# 读取、写入、内存、分片、并行和诊断设置（三个分表页面共用）
+opts = advanced_options()
+lazy, reader, compact, streaming = opts["lazy"], opts["reader"], opts["compact"], opts["streaming"]
+part_rows, part_mb, workers = opts["part_rows"], opts["part_mb"], opts["workers"]
+
+# 解析结果按文件内容缓存；按需读取时这里只读表头，数据在后台任务中并发解析
+# 读取失败的文件逐个提示并跳过，其余文件照常拆分
+books, files = [], []
+for f in uploaded_files or []:
+    try:
+        books.append(cached_workbook(f, lazy=lazy, data_only=False, reader=reader, compact=compact))
+        files.append(f)
+    except: st.error(f"读取失败: {f.name}")
+
+if books:
+    r2c1, r2c2, r2c3 = st.columns([1.5, 1.5, 1])
+
+    # 只列出所有文件都有的 Sheet 和表头
+    sheet_names = common_sheets(books)
+    selected_sheets = r2c1.multiselect("S", options=sheet_names, default=sheet_names, placeholder="选择共同 Sheet")
+    group_columns = r2c2.multiselect("C", options=common_columns(books, selected_sheets), placeholder="选择共同关键字列")
+    r2c3.metric("文件数量", f"{len(books)}")
+
+    r3c1, r3c2, r3c3 = st.columns([1.2, 1.4, 1.4])
+    output_mode = r3c1.radio("M", ["单文件 (多Sheet拆分)", "多文件 (跨Sheet汇总)"], horizontal=True)
+    # 合并时同名 Sheet 先跨文件纵向拼接，再像单个工作簿一样拆分
+    merge_mode = r3c1.radio("G", ["各文件分别拆分", "跨文件合并同名 Sheet"], horizontal=True)
+    # 无样式格式直接写出分组数据，跳过逐单元格的格式复制和美化
+    fmt_options = format_options()
+    fmt = fmt_options[r3c1.radio("F", list(fmt_options), horizontal=True)]
+    prefix = r3c2.text_input("P", placeholder="前缀")
+    suffix = r3c3.text_input("S", placeholder="后缀")
+
+    st.markdown("<br>", unsafe_allow_html=True)
+    r4c1, r4c2 = st.columns([1, 1])
+
+    if r4c1.button("⚙️ 开始分表", type="primary", use_container_width=True, disabled=not (group_columns and selected_sheets) or job_active()):
+        mode = "sheets" if "单文件" in output_mode else "merged"
+        merge = merge_mode.startswith("跨文件")
+        res_name = "批量分表结果" + batch_ext(mode, fmt, merge)
+        diag = Diagnostics(trace_memory=opts["trace_memory"])
+        diag.merge(take_parse_diagnostics())
+        diag.info.update(page="batch", file_count=len(books), size=sum(f.size for f in files), mode=mode, fmt=fmt,
+                         merge=merge, reader=reader, compact=compact,
+                         engine="streaming" if streaming else "standard", workers=workers)
+        # 分表在后台任务中执行，各文件的状态和耗时显示在进度面板中
+        start_batch_job(res_name, diag, books, [f.name for f in files],
+                        selected_sheets=selected_sheets, group_columns=group_columns, mode=mode, merge=merge,
+                        prefix=prefix, suffix=suffix, streaming=streaming, workers=workers, fmt=fmt,
+                        part_rows=part_rows, part_mb=part_mb)
+        st.rerun()
+
+    show_result(r4c2)
+
+# 后台分表任务的进度（任务进行中每秒刷新）
+show_job_progress()
@@ -0,0 +1 @@
+# 分表工具共用模块：页面脚本与命令行共用的读取、分组与写出逻辑
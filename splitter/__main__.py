@@ -0,0 +1,8 @@
+# python -m splitter：命令行批量分表入口
+import sys
+
+from .cli import main
+
+# 并行生成使用 spawn 进程池，子进程会重新导入主模块，必须放在 main 保护之下
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .diagnostics import Diagnostics
+from .engine import count_outputs, output_ext, run_split
+from .memo import RunMemo
+
+# 批量分表时同时读取、拆分的工作簿数
+BATCH_THREADS = int(os.environ.get("SPLIT_BATCH_THREADS", 4))
+# 把单个文件的结果复制进总 ZIP 时每次读写的字节数
+COPY_CHUNK = 1 << 20
+# 已是压缩格式的成员直接存入总 ZIP，不再压缩一遍
+STORED_EXTS = (".xlsx", ".parquet")
+
+
+# --- 多工作簿 ---
+def file_stems(names):
+    """各文件在结果 ZIP 中的名称：去掉扩展名，重名时追加序号"""
+    stems, seen = [], set()
+    for name in names:
+        base = stem = os.path.splitext(os.path.basename(name))[0] or "工作簿"
+        n = 0
+        while stem.lower() in seen:
+            n += 1
+            stem = f"{base}{n}"
+        seen.add(stem.lower())
+        stems.append(stem)
+    return stems
+
+
+def common_sheets(books):
+    """所有工作簿都有的 Sheet，按第一个工作簿中的顺序"""
+    if not books:
+        return []
+    names = set.intersection(*(set(book.sheet_names) for book in books))
+    return [s for s in books[0].sheet_names if s in names]
+
+
+def common_columns(books, selected_sheets):
+    """所有工作簿的选中 Sheet 都有的表头，按第一个工作簿中的顺序（只用表头，不解析数据）"""
+    heads = [book.heads[s] for book in books for s in selected_sheets if s in book.heads and book.heads[s]]
+    if not heads:
+        return []
+    names = set.intersection(*(set(h) for h in heads))
+    return [c for c in heads[0] if c in names]
+
+
+def merge_books(books, selected_sheets):
+    """跨文件合并：同名 Sheet 的数据按文件顺序纵向拼接，格式沿用第一个含该 Sheet 的文件"""
+    sheet_data = {}
+    for s_name in selected_sheets:
+        items = [book.sheets([s_name])[s_name] for book in books if s_name in book.heads]
+        frames = [item["df"] for item in items if not item["df"].empty]
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else (frames or [items[0]["df"]])[0]
+        sheet_data[s_name] = {"df": df, "layout": items[0]["layout"]}
+    return sheet_data
+
+
+def batch_ext(mode, fmt="styled", merge=False):
+    """批量结果的后缀：分别拆分时总是 ZIP；合并后与单个工作簿相同"""
+    return output_ext(mode, fmt) if merge else ".zip"
+
+
+def _memo(books):
+    # 工作簿都有缓存键时复用分组缓存；合并时以全部文件的缓存键作为来源
+    keys = tuple(getattr(book, "cache_key", None) for book in books)
+    if not all(keys):
+        return None
+    return RunMemo(keys[0] if len(keys) == 1 else keys)
+
+
+def _compress_type(name):
+    return zipfile.ZIP_STORED if name.lower().endswith(STORED_EXTS) else zipfile.ZIP_DEFLATED
+
+
+def _add_result(zipf, stem, path, ext):
+    # 单个文件的结果（磁盘上的临时文件）放进总 ZIP：xlsx 以文件名命名，ZIP 的成员放在以文件名命名的
+    # 目录下；按块复制，不把整个结果读入内存
+    if ext != ".zip":
+        zipf.write(path, f"{stem}{ext}", _compress_type(ext))
+        return
+    with zipfile.ZipFile(path) as zin:
+        for info in zin.infolist():
+            member = zipfile.ZipInfo(f"{stem}/{info.filename}", info.date_time)
+            member.compress_type = _compress_type(info.filename)
+            # 预先给出大小，超过 4 GB 的成员会自动使用 ZIP64
+            member.file_size = info.file_size
+            with zin.open(info) as src, zipf.open(member, "w") as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK)
+
+
+def _remove(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def split_batch(books, names, selected_sheets, group_columns, mode, target, merge=False, threads=BATCH_THREADS,
+                diag=None, progress=None, report=None, tmp_dir=None, **split_args):
+    """多个工作簿批量分表，结果写入一个 ZIP（merge=True 时为合并后的单个结果），返回输出数量
+
+    merge=False：各工作簿并发读取和拆分，每个文件的结果先写到 tmp_dir 中的临时文件（默认系统临时目录），
+    再按上传顺序复制进总 ZIP 并删除，内存中不保留任何一个文件的完整结果；
+    缺少分组列或选中 Sheet 的工作簿只拆分它有的部分。
+    merge=True：各工作簿并发读取后，同名 Sheet 纵向合并，再像单个工作簿一样拆分，
+    跨 Sheet 汇总时每组的文件包含所有工作簿中该组的数据。
+    progress(已完成数, 总数) 汇总所有文件的进度；report(文件名, **状态) 报告单个文件的
+    状态、进度和耗时。其余参数（prefix、fmt、workers 等）传给 run_split。
+    """
+    diag = diag or Diagnostics()
+    report = report or (lambda stem, **fields: None)
+    stems = file_stems(names)
+    threads = max(min(threads, len(books)), 1)
+    read_seconds = [0.0] * len(books)
+
+    def usable(book):
+        return [s for s in selected_sheets
+                if s in book.heads and set(group_columns) <= set(book.heads[s])]
+
+    def read(i, read_diag):
+        start = time.perf_counter()
+        report(stems[i], status="读取中")
+        sheet_data = books[i].sheets(usable(books[i]), diag=read_diag)
+        read_seconds[i] = time.perf_counter() - start
+        report(stems[i], status="已读取", seconds=round(read_seconds[i], 2))
+        return sheet_data
+
+    def outputs(sheet_data, sheets, memo):
+        return count_outputs(sheet_data, sheets, group_columns, mode, None, memo, split_args.get("part_rows"),
+                             split_args.get("part_mb"), split_args.get("fmt", "styled"))
+
+    if merge:
+        # 每个文件的解析统计分开记录，读取完成后再并入（工作簿在会话间共享，不在工作簿上累计）
+        read_diags = [Diagnostics() for _ in books]
+        with ThreadPoolExecutor(threads, thread_name_prefix="split-batch") as pool:
+            list(pool.map(read, range(len(books)), read_diags))
+        for read_diag in read_diags:
+            diag.merge(read_diag)
+        diag.info["files"] = [{"file": name, "seconds": round(s, 3)} for name, s in zip(names, read_seconds)]
+        sheets = [s for s in selected_sheets if any(s in usable(book) for book in books)]
+        with diag.stage("merge"):
+            sheet_data = merge_books(books, sheets)
+        memo = _memo(books)
+        total = outputs(sheet_data, sheets, memo)
+        if progress:
+            progress(0, total)
+        return run_split(sheet_data, sheets, group_columns, mode, target, diag=diag, memo=memo,
+                         progress=progress and (lambda done: progress(done, total)), **split_args)
+
+    ext = output_ext(mode, split_args.get("fmt", "styled"))
+    dones, totals = [0] * len(books), [0] * len(books)
+
+    def split_one(i):
+        start = time.perf_counter()
+        file_diag = Diagnostics(diag.trace_memory)
+        sheet_data = read(i, file_diag)
+        sheets = list(sheet_data)
+        if not sheets:
+            report(stems[i], status="跳过（缺少分组列）")
+            return None, 0, file_diag, time.perf_counter() - start
+        memo = _memo(books[i:i + 1])
+        totals[i] = outputs(sheet_data, sheets, memo)
+        report(stems[i], status="拆分中", done=0, total=totals[i])
+
+        def file_progress(done):
+            dones[i] = done
+            report(stems[i], done=done)
+            if progress:
+                progress(sum(dones), sum(totals))
+
+        fd, path = tempfile.mkstemp(prefix="batch-", suffix=ext, dir=tmp_dir)
+        os.close(fd)
+        try:
+            count = run_split(sheet_data, sheets, group_columns, mode, path, diag=file_diag, progress=file_progress,
+                              memo=memo, **split_args)
+        except BaseException:
+            _remove(path)
+            raise
+        seconds = time.perf_counter() - start
+        report(stems[i], status="完成", seconds=round(seconds, 2))
+        return path, count, file_diag, seconds
+
+    count = 0
+    files = []
+    futures = []
+    try:
+        with ThreadPoolExecutor(threads, thread_name_prefix="split-batch") as pool, \
+                zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
+            futures = [pool.submit(split_one, i) for i in range(len(books))]
+            try:
+                # 按上传顺序写入总 ZIP，先完成的文件在磁盘上等待前面的文件，写入后即删除
+                for i, future in enumerate(futures):
+                    path, n, file_diag, seconds = future.result()
+                    diag.merge(file_diag)
+                    files.append({"file": names[i], "outputs": n, "seconds": round(seconds, 3)})
+                    if n:
+                        with diag.stage("zip"):
+                            _add_result(zipf, stems[i], path, ext)
+                    _remove(path)
+                    count += n
+            except BaseException:
+                # 取消或失败：尚未开始的文件不再处理，正在处理的文件在下一次报告进度时停止
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        # 线程池退出时所有任务都已结束；失败或取消后删除还没写入总 ZIP 的临时文件
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                _remove(future.result()[0])
+    diag.info["files"] = files
+    return count
@@ -0,0 +1,69 @@
+import os
+import threading
+from collections import OrderedDict
+
+# 解析缓存的总内存预算（MB），整个服务进程内所有会话共享
+CACHE_BUDGET_MB = int(os.environ.get("SPLIT_CACHE_MB", 1024))
+
+
+class WorkbookCache:
+    """跨会话共享的解析结果缓存：键为内容哈希加读取参数，超出内存预算时按 LRU 淘汰
+
+    同一个键同时被多个会话请求时只解析一次。最近使用的一项即使超出预算也保留，
+    否则正在使用它的会话每次重跑都要重新解析。
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, load):
+        """返回 key 对应的工作簿，没有时调用 load() 解析并放入缓存"""
+        with self._lock:
+            if key in self._items:
+                return self._hit(key)
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._items:
+                    return self._hit(key)
+            try:
+                book = load()
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            # 放入缓存和移除解析中的记录在同一次加锁内完成，之后到达的请求一定能命中
+            with self._lock:
+                self.misses += 1
+                self._items[key] = book
+                self._loading.pop(key, None)
+                self._evict()
+            return book
+
+    def _hit(self, key):
+        self.hits += 1
+        self._items.move_to_end(key)
+        # 按需读取的工作簿会随选中的 sheet 增长，每次访问都重新核算预算
+        self._evict()
+        return self._items[key]
+
+    def _evict(self):
+        while len(self._items) > 1 and self.nbytes() > self.budget_bytes:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def nbytes(self):
+        return sum(book.memory_usage() for book in self._items.values())
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "mb": round(self.nbytes() / 2 ** 20, 1),
+                    "budget_mb": round(self.budget_bytes / 2 ** 20, 1),
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+workbook_cache = WorkbookCache(CACHE_BUDGET_MB * 2 ** 20)
@@ -0,0 +1,149 @@
+# 命令行批量分表：python -m splitter 输入路径... -c 分组列 [-m sheets|files|merged]
+import argparse
+import os
+import sys
+import time
+
+from .diagnostics import Diagnostics
+from .engine import MODES, collect_groups, output_ext, run_split
+from .ingest import READERS, open_workbook
+from .planner import plan_split
+from .projection import FILTER_OPS, make_view
+from .writer import OUTPUT_FORMATS, parquet_available
+
+
+def find_workbooks(paths):
+    """展开输入路径：文件原样保留，目录取其中的 .xlsx（跳过 Excel 的 ~$ 锁文件）"""
+    found = []
+    for p in paths:
+        if os.path.isdir(p):
+            found.extend(os.path.join(p, f) for f in sorted(os.listdir(p))
+                         if f.lower().endswith(".xlsx") and not f.startswith("~$"))
+        else:
+            found.append(p)
+    return found
+
+
+def split_file(path, args):
+    """处理单个工作簿，返回 (输出路径, 数量)；没有可分的 Sheet 时返回 (None, 0)"""
+    diag = Diagnostics(trace_memory=args.trace_memory)
+    book = open_workbook(path, lazy=not args.full_read, reader=args.reader, compact=args.compact, diag=diag)
+    names = args.sheets or book.sheet_names
+    missing = [s for s in names if s not in book.sheet_names]
+    if missing:
+        print(f"  ! 跳过不存在的 Sheet: {', '.join(missing)}", file=sys.stderr)
+    # 只保留包含全部分组列的 Sheet
+    selected = [s for s in names if s in book.heads and set(args.columns) <= set(book.heads[s])]
+    for s in [s for s in names if s not in missing and s not in selected]:
+        print(f"  ! Sheet「{s}」缺少分组列，已跳过", file=sys.stderr)
+    if not selected:
+        return None, 0
+
+    # 输出列总会包含分组列；视图在解析时生效
+    keep = args.columns + [c for c in args.keep if c not in args.columns] if args.keep else None
+    sheet_data = book.sheets(selected, make_view(keep, args.where or []), diag=diag)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    out_path = os.path.join(args.out or os.path.dirname(os.path.abspath(path)), f"{stem}-分表结果{output_ext(args.mode, args.format)}")
+    diag.info.update(file=path, mode=args.mode, fmt=args.format, reader=args.reader, engine="streaming" if args.streaming else "standard",
+                     workers=args.workers)
+    groups = collect_groups(sheet_data, selected, args.columns) if args.mode == "merged" else None
+    if args.dry_run:
+        plan = plan_split(sheet_data, selected, args.columns, args.mode, args.format, args.prefix, args.suffix,
+                          sheet_in_name=not args.no_sheet_name, groups=groups, part_rows=args.part_rows,
+                          part_mb=args.part_mb, streaming=args.streaming, workers=args.workers)
+        print_plan(plan)
+        return out_path, plan["count"]
+    count = run_split(sheet_data, selected, args.columns, args.mode, out_path, args.prefix, args.suffix,
+                      streaming=args.streaming, workers=args.workers,
+                      sheet_in_name=not args.no_sheet_name, groups=groups, diag=diag, fmt=args.format,
+                      part_rows=args.part_rows, part_mb=args.part_mb)
+    if args.diagnostics:
+        diag.info["outputs"] = count
+        print_diagnostics(diag.log())
+    return out_path, count
+
+
+def print_plan(plan, limit=20):
+    print(f"    {plan['count']} 个输出，共 {plan['rows']} 行，结果约 {plan['bytes'] / 1024 / 1024:.1f} MB，"
+          f"内存峰值约 {plan['peak_bytes'] / 1024 / 1024:.1f} MB（估算）")
+    for name, rows in plan["outputs"][["名称", "行数"]].head(limit).itertuples(index=False):
+        print(f"      {name}  {rows} 行")
+    if plan["count"] > limit:
+        print(f"      … 其余 {plan['count'] - limit} 个")
+    for message in plan["warnings"]:
+        print(f"    ! {message}", file=sys.stderr)
+    for message in plan["errors"]:
+        print(f"    ✗ {message}", file=sys.stderr)
+
+
+def print_diagnostics(summary):
+    for item in summary["stages"]:
+        peak = "" if item["peak_mb"] is None else f" 峰值 {item['peak_mb']} MB"
+        print(f"    {item['stage']:<14} {item['seconds']:8.3f}s ×{item['calls']:<5} {item['rows']} 行{peak}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m splitter", description="按分组列批量拆分 Excel 工作簿")
+    parser.add_argument("inputs", nargs="+", help="工作簿文件或目录（目录下的全部 .xlsx）")
+    parser.add_argument("-c", "--columns", nargs="+", required=True, help="分组列（表头名称）")
+    parser.add_argument("-s", "--sheets", nargs="+", help="要拆分的 Sheet，默认全部")
+    parser.add_argument("-m", "--mode", choices=MODES, default="sheets",
+                        help="sheets=单文件多 Sheet，files=每组一个文件 (ZIP)，merged=跨 Sheet 汇总 (ZIP)")
+    parser.add_argument("--prefix", default="", help="命名前缀")
+    parser.add_argument("--suffix", default="", help="命名后缀")
+    parser.add_argument("-o", "--out", help="输出目录，默认与输入文件相同")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="styled",
+                        help="styled=保留格式并美化，xlsx=无样式，csv / parquet=纯数据打包为 ZIP（parquet 需要 pyarrow）")
+    parser.add_argument("--keep", nargs="+", help="只输出这些列（分组列总会保留），默认全部列")
+    parser.add_argument("--where", nargs=3, action="append", metavar=("列", "运算符", "值"),
+                        help=f"行筛选，可多次给出（同时满足）；运算符: {', '.join(FILTER_OPS.values())}，"
+                             "between 的值为 下限~上限，eq / ne 可用逗号分隔多个值")
+    parser.add_argument("--part-rows", type=int, help="每个输出 Sheet / 文件最多的数据行数，超出的组拆成 -part1、-part2…")
+    parser.add_argument("--part-mb", type=float, help="每个输出 Sheet / 文件的估算大小上限 (MB)")
+    parser.add_argument("--streaming", action="store_true", help="流式写入 (省内存)")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="ZIP 模式的并行进程数")
+    parser.add_argument("--full-read", action="store_true", help="完整读取（默认只解析选中的 Sheet）")
+    parser.add_argument("--reader", choices=READERS, default="openpyxl",
+                        help="按需读取时的读取后端，calamine 需要安装 python-calamine")
+    parser.add_argument("--compact", action="store_true", help="紧凑内存：低基数文本列转分类、整数缩小位宽")
+    parser.add_argument("--dry-run", action="store_true", help="只预演：列出输出名称并估算大小和内存，不写出结果")
+    parser.add_argument("--diagnostics", action="store_true", help="打印各阶段耗时，并输出一行 JSON 日志")
+    parser.add_argument("--trace-memory", action="store_true", help="诊断中记录各阶段内存峰值（较慢）")
+    parser.add_argument("--no-sheet-name", action="store_true", help="单文件模式下 Sheet 名不附加原 Sheet 名")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.format == "parquet" and not parquet_available():
+        parser.error("parquet 输出需要安装 pyarrow")
+    try:
+        make_view(args.keep, args.where or [])
+    except ValueError as e:
+        parser.error(str(e))
+    files = find_workbooks(args.inputs)
+    if not files:
+        print("没有找到 .xlsx 文件", file=sys.stderr)
+        return 1
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+
+    failed = 0
+    for path in files:
+        print(f"{path}")
+        start = time.perf_counter()
+        try:
+            out_path, count = split_file(path, args)
+        except Exception as e:
+            # 单个文件失败不影响批量中的其他文件
+            failed += 1
+            print(f"  ✗ 失败: {e}", file=sys.stderr)
+            continue
+        if out_path is None:
+            print("  - 没有可拆分的 Sheet")
+        elif args.dry_run:
+            print(f"  · 预演 {count} 个 → {out_path}（未写出）")
+        else:
+            print(f"  ✓ {count} 个 → {out_path} ({time.perf_counter() - start:.1f}s)")
+    return 1 if failed else 0
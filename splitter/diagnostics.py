@@ -0,0 +1,101 @@
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计进程内存峰值
+    resource = None
+
+# 每次分表输出一行 JSON 日志，便于在生产环境上汇总热点
+logger = logging.getLogger("splitter.diagnostics")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def max_rss_mb():
+    """进程的内存峰值（MB），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(rss / (1024 * 1024 if rss > 1 << 32 else 1024), 1)
+
+
+class Diagnostics:
+    """一次分表运行的分阶段统计：耗时、处理的行数/单元格数，可选各阶段内存峰值
+
+    同名阶段多次出现时累加（例如每个分组写一次）。trace_memory=True 时
+    每个阶段用 tracemalloc 记录该阶段内新分配内存的峰值；tracemalloc 是
+    进程级的，多个会话同时开启时数值仅供参考。阶段之间不要嵌套。
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.info = {}
+        self._start = time.perf_counter()
+
+    def add(self, name, seconds, rows=0, cells=0, peak=None, calls=1):
+        item = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "rows": 0, "cells": 0, "peak": None})
+        item["calls"] += calls
+        item["seconds"] += seconds
+        item["rows"] += rows
+        item["cells"] += cells
+        if peak is not None:
+            item["peak"] = max(item["peak"] or 0, peak)
+
+    @contextmanager
+    def stage(self, name, rows=0, cells=0):
+        """计时上下文；行数/单元格数事后才知道时，可以修改 with 得到的 counts 字典"""
+        counts = {"rows": rows, "cells": cells}
+        started = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started = True
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory and tracemalloc.is_tracing() else None
+            if started:
+                tracemalloc.stop()
+            self.add(name, seconds, counts["rows"], counts["cells"], peak)
+
+    def iterate(self, name, iterable):
+        """逐项产出 iterable，把生成每一项的时间计入 name 阶段（用于统计惰性的分组/计划）"""
+        it = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def merge(self, other):
+        """并入另一份统计（例如上传时解析工作簿的耗时）"""
+        for name, item in other.stages.items():
+            self.add(name, item["seconds"], item["rows"], item["cells"], item["peak"], item["calls"])
+
+    def summary(self):
+        stages = [{"stage": name, "calls": item["calls"], "seconds": round(item["seconds"], 4),
+                   "rows": item["rows"], "cells": item["cells"],
+                   "peak_mb": None if item["peak"] is None else round(item["peak"] / 2 ** 20, 1)}
+                  for name, item in self.stages.items()]
+        return {**self.info, "total_seconds": round(time.perf_counter() - self._start, 4),
+                "max_rss_mb": max_rss_mb(), "stages": stages}
+
+    def log(self):
+        summary = self.summary()
+        logger.info(json.dumps(summary, ensure_ascii=False, default=str))
+        return summary
@@ -0,0 +1,413 @@
+import os
+import re
+import zipfile
+from collections import deque
+
+import pandas as pd
+
+from .diagnostics import Diagnostics
+from .grouping import build_group_index, index_key
+from .memo import group_token, index_nbytes, rename_sheets
+from .parallel import iter_workbooks
+from .writer import (FRAME_FORMATS, OUTPUT_FORMATS, copy_format_and_write, excel_book, write_group_stream,
+                     write_plain_sheet)
+
+# 输出方式：sheets = 单文件多 Sheet；files = 每个 Sheet 的每组一个文件 (ZIP)；merged = 每组一个文件，跨 Sheet 汇总 (ZIP)
+MODES = ("sheets", "files", "merged")
+# Excel 单个工作表的行数上限（含表头）
+EXCEL_MAX_ROWS = 1048576
+# Sheet 名（以及为统一起见的文件名）的长度上限
+NAME_LIMIT = 31
+
+
+def output_ext(mode, fmt="styled"):
+    """结果文件的后缀：只有单文件的 xlsx 输出不打包，CSV / Parquet 总是打包为 ZIP"""
+    return ".xlsx" if mode == "sheets" and fmt not in FRAME_FORMATS else ".zip"
+
+
+# --- 命名 ---
+def full_name(prefix, suffix, group_name, sheet_name=""):
+    """截断前的完整名称（已替换非法字符），make_name 在此基础上限制长度"""
+    if isinstance(group_name, tuple):
+        # 处理多列分组的情况，用“-”连接内容
+        group_part = "-".join(str(v) for v in group_name if pd.notna(v))
+    else:
+        group_part = str(group_name)
+    parts = [p.strip() for p in [prefix, group_part, suffix, sheet_name] if p.strip()]
+    name = "-".join(parts)
+    # 替换 Windows 系统文件名不允许的非法字符
+    return re.sub(r'[\\/*?:[\]]', '_', name)
+
+
+def make_name(prefix, suffix, group_name, sheet_name=""):
+    # 限制长度（Excel Sheet名上限为31字符）
+    return full_name(prefix, suffix, group_name, sheet_name)[:NAME_LIMIT].strip('_- ') or "结果"
+
+
+def part_name(name, part, limit=NAME_LIMIT):
+    """分片名称 name-partN；先截短 name，保证加上片号后仍不超过 31 个字符"""
+    if not part:
+        return name
+    tag = f"-part{part}"
+    return name[:limit - len(tag)].rstrip('_- ') + tag
+
+
+# --- 分组 ---
+def unique_groups(sheet_data, s_name, group_columns, memo=None):
+    """一个 Sheet 中不重复的分组键（DataFrame），按 (Sheet, 分组列) 缓存"""
+    def compute():
+        return sheet_data[s_name]["df"][group_columns].dropna().drop_duplicates()
+
+    if memo is None:
+        return compute()
+    return memo.cached("unique", (s_name, tuple(group_columns)), compute,
+                       lambda frame: int(frame.memory_usage(index=True, deep=True).sum()))
+
+
+def _union_groups(sheet_data, selected_sheets, group_columns, memo=None):
+    # 各 Sheet 的去重结果拼接后再整体去重一次，全程向量化，不逐行放进 Python set
+    frames = [unique_groups(sheet_data, s, group_columns, memo)
+              for s in selected_sheets if not sheet_data[s]["df"].empty]
+    if len(frames) <= 1:
+        return frames[0] if frames else None
+    return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+
+def estimate_groups(sheet_data, selected_sheets, group_columns, memo=None):
+    """“预计数量”：所有选中 Sheet 的分组并集的大小"""
+    union = _union_groups(sheet_data, selected_sheets, group_columns, memo)
+    return 0 if union is None else len(union)
+
+
+def _group_sort_key(group_val):
+    vals = group_val if isinstance(group_val, tuple) else (group_val,)
+    return tuple((type(v).__name__, v) for v in vals)
+
+
+def collect_groups(sheet_data, selected_sheets, group_columns, memo=None):
+    """所有选中 Sheet 的分组并集（跨 Sheet 汇总时按最大的并集输出）"""
+    union = _union_groups(sheet_data, selected_sheets, group_columns, memo)
+    if union is None:
+        return []
+    if len(group_columns) > 1:
+        groups = list(union.itertuples(index=False, name=None))
+    else:
+        groups = union.iloc[:, 0].tolist()
+    try:
+        return sorted(groups)
+    except TypeError:
+        # 同一列中混有数字和文本等无法直接比较的值时，先按类型再按值排序
+        return sorted(groups, key=_group_sort_key)
+
+
+def group_indices(sheet_data, s_name, group_columns, memo=None):
+    """{分组值元组: 行位置}，顺序与 groupby(sort=False) 逐组迭代一致；memo 为 RunMemo 时复用缓存"""
+    df_s = sheet_data[s_name]["df"]
+
+    def compute():
+        # 紧凑模式下分组列可能是分类类型，只保留实际出现的组合
+        indices = df_s.groupby(group_columns, sort=False, observed=True).indices
+        return {k if isinstance(k, tuple) else (k,): v for k, v in indices.items()}
+
+    if memo is None:
+        return compute()
+    return memo.cached("index", (s_name, tuple(group_columns)), compute, index_nbytes)
+
+
+def iter_group_keys(sheet_data, selected_sheets, group_columns, memo=None):
+    """按 Sheet 顺序逐组产出 (sheet 名, 分组值, 行位置)"""
+    for s_name in selected_sheets:
+        if sheet_data[s_name]["df"].empty:
+            continue
+        for name, positions in group_indices(sheet_data, s_name, group_columns, memo).items():
+            yield s_name, name, positions
+
+
+# --- 分片 ---
+def rows_per_part(df, part_rows=None, part_mb=None, fmt="styled"):
+    """一个 Sheet 每片最多的数据行数，None 表示不分片
+
+    part_mb 按 DataFrame 的内存占用估算每行大小；xlsx 输出总是不超过 Excel 的行数上限。
+    """
+    limits = [part_rows] if part_rows else []
+    if part_mb and len(df):
+        row_bytes = max(df.memory_usage(index=False, deep=True).sum() / len(df), 1)
+        limits.append(max(int(part_mb * 1024 * 1024 // row_bytes), 1))
+    if fmt not in FRAME_FORMATS:
+        limits.append(EXCEL_MAX_ROWS - 1)
+    return min(limits) if limits else None
+
+
+def part_sizes(sheet_data, selected_sheets, part_rows=None, part_mb=None, fmt="styled"):
+    """{sheet 名: 每片行数}，每次运行只估算一次"""
+    return {s: rows_per_part(sheet_data[s]["df"], part_rows, part_mb, fmt) for s in selected_sheets}
+
+
+def split_positions(positions, size):
+    """行位置按 size 切片；不超过 size 时只有一片"""
+    if not size or len(positions) <= size:
+        return [positions]
+    return [positions[i:i + size] for i in range(0, len(positions), size)]
+
+
+def iter_group_parts(sheet_data, selected_sheets, group_columns, memo=None, sizes=None):
+    """逐片产出 (sheet 名, 分组值, 行位置, 片号)；没有分片的组片号为 0"""
+    sizes = sizes or {}
+    for s_name, name, positions in iter_group_keys(sheet_data, selected_sheets, group_columns, memo):
+        chunks = split_positions(positions, sizes.get(s_name))
+        for part, chunk in enumerate(chunks, 1):
+            yield s_name, name, chunk, part if len(chunks) > 1 else 0
+
+
+def _part_token(token, part, size):
+    # 分片的内容取决于片号和每片行数；不分片时与原来的缓存标识相同
+    return token + (part, size) if part else token
+
+
+def count_outputs(sheet_data, selected_sheets, group_columns, mode, groups=None, memo=None,
+                  part_rows=None, part_mb=None, fmt="styled"):
+    """将要生成的 Sheet / 文件数量，用于显示进度（分片时按片计数）"""
+    if mode == "merged" and not (part_rows or part_mb):
+        return estimate_groups(sheet_data, selected_sheets, group_columns, memo) if groups is None else len(groups)
+    sizes = part_sizes(sheet_data, selected_sheets, part_rows, part_mb, fmt)
+    if mode == "merged":
+        return sum(1 for _ in plan_merged_parts(sheet_data, selected_sheets, group_columns, groups, memo, sizes))
+    return sum(1 for _ in iter_group_parts(sheet_data, selected_sheets, group_columns, memo, sizes))
+
+
+# --- 输出计划 ---
+def unique_name(seen, name, limit=NAME_LIMIT):
+    """与 openpyxl 的重名处理相同（不区分大小写，追加序号），但追加序号后仍不超过 limit 个字符
+
+    seen 为已用名称的小写集合，组数多时不必逐个比较。
+    """
+    candidate, n = name, 0
+    while candidate.lower() in seen:
+        n += 1
+        tag = str(n)
+        candidate = name[:limit - len(tag)] + tag
+    seen.add(candidate.lower())
+    return candidate
+
+
+def sheet_outputs(sheet_data, selected_sheets, group_columns, prefix="", suffix="", sheet_in_name=True, memo=None,
+                  sizes=None):
+    """单文件模式的各输出 Sheet：(去重后的名称, 去重前的名称, sheet 名, 分组值, 行位置, 片号)，不切分数据"""
+    seen = set()
+    for s_name, name, positions, part in iter_group_parts(sheet_data, selected_sheets, group_columns, memo, sizes):
+        base = part_name(make_name(prefix, suffix, name, s_name if sheet_in_name else ""), part)
+        yield unique_name(seen, base), base, s_name, name, positions, part
+
+
+def file_outputs(sheet_data, selected_sheets, group_columns, mode, prefix="", suffix="", groups=None, memo=None,
+                 sizes=None):
+    """ZIP 模式的各输出文件：(去重后的文件名主干, 去重前的主干, 分组值, [(sheet 名, 行位置), ...], 缓存标识)
+
+    files 模式下不同 Sheet 的同名分组、截断后相同的名称都会追加序号，ZIP 中不会出现重名成员。
+    成员工作簿的内容与命名无关，缓存标识只由来源 Sheet、分组值和分片决定。
+    """
+    seen = set()
+    sizes = sizes or {}
+    if mode == "files":
+        for s_name, name, positions, part in iter_group_parts(sheet_data, selected_sheets, group_columns, memo,
+                                                              sizes):
+            base = part_name(make_name(prefix, suffix, name), part)
+            yield (unique_name(seen, base), base, name, [(s_name, positions)],
+                   _part_token((s_name, group_token(name)), part, sizes.get(s_name)))
+        return
+
+    for group_val, key, part, chunks in plan_merged_parts(sheet_data, selected_sheets, group_columns, groups, memo,
+                                                          sizes):
+        base = part_name(make_name(prefix, suffix, group_val), part)
+        yield (unique_name(seen, base), base, group_val, chunks,
+               _part_token((tuple(selected_sheets), key), part, tuple(sizes.get(s) for s in selected_sheets)))
+
+
+def plan_titles(sheet_data, selected_sheets, group_columns, prefix="", suffix="", sheet_in_name=True, memo=None,
+                sizes=None):
+    """单文件模式下各输出 Sheet 的名称（已去重），不切分数据；sizes 见 part_sizes"""
+    return [item[0] for item in sheet_outputs(sheet_data, selected_sheets, group_columns, prefix, suffix,
+                                              sheet_in_name, memo, sizes)]
+
+
+def plan_sheets(sheet_data, selected_sheets, group_columns, prefix="", suffix="", sheet_in_name=True, memo=None,
+                sizes=None):
+    """单文件模式：逐个产出 (输出 Sheet 名, layout, DataFrame)；超过每片行数的组拆成多个 Sheet"""
+    for title, _, s_name, _, positions, _ in sheet_outputs(sheet_data, selected_sheets, group_columns, prefix,
+                                                           suffix, sheet_in_name, memo, sizes):
+        yield title, sheet_data[s_name]["layout"], sheet_data[s_name]["df"].iloc[positions]
+
+
+def plan_merged_parts(sheet_data, selected_sheets, group_columns, groups=None, memo=None, sizes=None):
+    """跨 Sheet 汇总的每个输出：(分组值, 分组键, 片号, [(sheet 名, 行位置), ...])
+
+    分片时第 k 个文件包含各 Sheet 该组的第 k 片，文件数取各 Sheet 片数的最大值。
+    """
+    # 每个 Sheet 只做一次分组，得到 分组键 -> 行位置 的索引，后面按组直接取行
+    if groups is None:
+        groups = collect_groups(sheet_data, selected_sheets, group_columns, memo)
+    sizes = sizes or {}
+    group_index = {s: _str_index(sheet_data, s, group_columns, memo)
+                   for s in selected_sheets if not sheet_data[s]["df"].empty}
+    for group_val in groups:
+        key = index_key(group_val)
+        # 组内每个有数据的 Sheet 各占一个工作表
+        chunks = [(s_name, split_positions(group_index[s_name][key], sizes.get(s_name)))
+                  for s_name in selected_sheets if key in group_index.get(s_name, {})]
+        n_parts = max((len(c) for _, c in chunks), default=0)
+        for part in range(1, n_parts + 1):
+            yield (group_val, key, part if n_parts > 1 else 0,
+                   [(s_name, c[part - 1]) for s_name, c in chunks if len(c) >= part])
+
+
+def plan_files(sheet_data, selected_sheets, group_columns, mode, prefix="", suffix="", groups=None, memo=None,
+               sizes=None):
+    """ZIP 模式：逐个产出 (文件名, [(Sheet 名, layout, DataFrame), ...], 成员的缓存标识)"""
+    for stem, _, _, chunks, token in file_outputs(sheet_data, selected_sheets, group_columns, mode, prefix, suffix,
+                                                  groups, memo, sizes):
+        # 每组一个文件时工作表沿用 Sheet1；跨 Sheet 汇总时以来源 Sheet 命名
+        sheets = [("Sheet1" if mode == "files" else s_name, sheet_data[s_name]["layout"],
+                   sheet_data[s_name]["df"].iloc[positions]) for s_name, positions in chunks]
+        yield f"{stem}.xlsx", sheets, token
+
+
+def plan_members(sheet_data, selected_sheets, group_columns, mode, fmt="styled", prefix="", suffix="",
+                 sheet_in_name=True, groups=None, memo=None, sizes=None):
+    """ZIP 成员计划：逐个产出 (成员名, [(Sheet 名, layout, DataFrame), ...], 缓存标识, 是否为该输出的最后一个成员)
+
+    CSV / Parquet 一个文件只能放一张表：单文件模式下每个输出 Sheet 一个文件；
+    跨 Sheet 汇总时组内有多个 Sheet 的，放在以组命名的目录下，每个 Sheet 一个文件。
+    """
+    ext = f".{fmt}" if fmt in FRAME_FORMATS else ".xlsx"
+    sizes = sizes or {}
+    if mode == "sheets":
+        for title, _, s_name, name, positions, part in sheet_outputs(sheet_data, selected_sheets, group_columns,
+                                                                     prefix, suffix, sheet_in_name, memo, sizes):
+            group = sheet_data[s_name]["df"].iloc[positions]
+            yield (f"{title}{ext}", [(title, sheet_data[s_name]["layout"], group)],
+                   _part_token((s_name, group_token(name)), part, sizes.get(s_name)), True)
+        return
+    for file_name, sheets, token in plan_files(sheet_data, selected_sheets, group_columns, mode, prefix, suffix,
+                                               groups, memo, sizes):
+        stem = file_name[:-len(".xlsx")]
+        if ext == ".xlsx" or len(sheets) == 1:
+            yield stem + ext, sheets, token, True
+            continue
+        for i, sheet in enumerate(sheets, 1):
+            yield f"{stem}/{sheet[0]}{ext}", [sheet], token + (sheet[0],), i == len(sheets)
+
+
+def _str_index(sheet_data, s_name, group_columns, memo=None):
+    if memo is None:
+        return build_group_index(sheet_data[s_name]["df"], group_columns)
+    return memo.cached("str_index", (s_name, tuple(group_columns)),
+                       lambda: build_group_index(sheet_data[s_name]["df"], group_columns), index_nbytes)
+
+
+def _write_target(target, data):
+    if hasattr(target, "write"):
+        target.write(data)
+    else:
+        with open(target, "wb") as f:
+            f.write(data)
+
+
+def _read_target(target):
+    if hasattr(target, "getvalue"):
+        return target.getvalue()
+    with open(target, "rb") as f:
+        return f.read()
+
+
+def _target_size(target):
+    if hasattr(target, "getbuffer"):
+        return target.getbuffer().nbytes
+    return os.path.getsize(target)
+
+
+# --- 写出 ---
+def run_split(sheet_data, selected_sheets, group_columns, mode, target, prefix="", suffix="",
+              streaming=False, workers=1, sheet_in_name=True, groups=None, diag=None, progress=None, memo=None,
+              fmt="styled", part_rows=None, part_mb=None):
+    """按计划写出结果到 target（路径或文件对象），返回生成的 Sheet / 文件数量
+
+    diag 为 Diagnostics 时记录各阶段：groupby（分组与输出计划）、write.cells、
+    write.styles、save（序列化工作簿）、render.wait（并行等待）、zip（压缩写入）、
+    memo.rename（缓存结果改名）。
+    progress(已完成数) 在每个 Sheet / 文件写完后调用；它抛出的异常会中止分表（用于取消）。
+    memo 为 RunMemo 时复用已生成的分组索引和分组结果：只改前后缀或在单文件 / ZIP
+    之间切换时，不再重新 groupby 和写单元格。
+    fmt 为输出格式（见 writer.OUTPUT_FORMATS）：xlsx / csv / parquet 只写数据，不套用任何样式；
+    csv / parquet 时结果总是 ZIP（见 plan_members），后缀由 output_ext 给出。
+    part_rows / part_mb 限制每个输出 Sheet / 文件的行数或估算大小，超出的组拆成 名称-part1、
+    名称-part2…；xlsx 输出总是按 Excel 的行数上限分片。
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的输出方式: {mode}")
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"未知的输出格式: {fmt}")
+    diag = diag or Diagnostics()
+    count = 0
+    sizes = part_sizes(sheet_data, selected_sheets, part_rows, part_mb, fmt)
+    if mode == "sheets" and fmt not in FRAME_FORMATS:
+        book_key = cached = None
+        if memo is not None:
+            book_key, cached = memo.lookup("workbook", fmt, streaming, tuple(selected_sheets), tuple(group_columns),
+                                           tuple(sizes.values()))
+        if cached is not None:
+            # 同样的分组已生成过：Sheet 内容相同，只需按新的命名改写 Sheet 名
+            data, old_titles = cached
+            with diag.stage("memo.rename"):
+                titles = plan_titles(sheet_data, selected_sheets, group_columns, prefix, suffix, sheet_in_name, memo,
+                                     sizes)
+                _write_target(target, data if titles == old_titles else rename_sheets(data, titles))
+            if progress:
+                progress(len(titles))
+            return len(titles)
+
+        if fmt == "xlsx":
+            write_sheet, streaming = write_plain_sheet, True
+        else:
+            write_sheet = write_group_stream if streaming else copy_format_and_write
+        plan = plan_sheets(sheet_data, selected_sheets, group_columns, prefix, suffix, sheet_in_name, memo, sizes)
+        with excel_book(target, streaming, diag) as out_book:
+            for title, layout, group in diag.iterate("groupby", plan):
+                write_sheet(out_book.create_sheet(title), layout, group, diag)
+                count += 1
+                if progress:
+                    progress(count)
+            titles = list(out_book.sheetnames)
+        # 先看大小，缓存放不下的结果不再读回内存
+        if book_key is not None and count and memo.accepts(_target_size(target)):
+            data = _read_target(target)
+            memo.put(book_key, (data, titles), len(data))
+        return count
+
+    # 已缓存的成员直接交给 iter_workbooks 原样产出，按顺序记下各成员的缓存键，生成后再存入
+    member_keys = deque()
+
+    def jobs():
+        for file_name, sheets, token, last in plan_members(sheet_data, selected_sheets, group_columns, mode, fmt,
+                                                           prefix, suffix, sheet_in_name, groups, memo, sizes):
+            key = data = None
+            if memo is not None:
+                # 成员内容取决于分组列：换分组列后同名分组值的成员不能复用
+                key, data = memo.lookup("member", mode, fmt, streaming, tuple(group_columns), token)
+            member_keys.append((None if data is not None else key, last))
+            yield file_name, (data if data is not None else sheets)
+
+    # 成员逐个写入，超过 4GB 或 65535 个成员时自动使用 ZIP64
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zipf:
+        # 各组工作簿可交给进程池并行生成，按原顺序写入 ZIP
+        for file_name, data in iter_workbooks(diag.iterate("groupby", jobs()), workers, streaming, diag, fmt):
+            key, last = member_keys.popleft()
+            if key is not None:
+                memo.put(key, data, len(data))
+            with diag.stage("zip"):
+                zipf.writestr(file_name, data)
+            # 汇总的一组拆成多个 CSV / Parquet 时，整组写完才算一个输出
+            if last:
+                count += 1
+                if progress:
+                    progress(count)
+    return count
@@ -0,0 +1,18 @@
+# --- 分组索引 ---
+def build_group_index(df, group_columns):
+    """对一个 sheet 做一次 groupby，得到 {分组键: 行位置数组}
+
+    键是各分组列 astype(str) 后组成的元组，与原先逐组
+    `df[group_columns].astype(str) == [...]` 的字符串比较语义完全一致。
+    """
+    keys = df[group_columns].astype(str)
+    if len(group_columns) == 1:
+        col = keys.iloc[:, 0]
+        return {(k,): positions for k, positions in col.groupby(col, sort=False).indices.items()}
+    return keys.groupby(list(keys.columns), sort=False).indices
+
+
+def index_key(group_val):
+    """把分组值转换成 build_group_index 的键"""
+    vals = group_val if isinstance(group_val, tuple) else [group_val]
+    return tuple(str(v) for v in vals)
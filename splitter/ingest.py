@@ -0,0 +1,499 @@
+import datetime
+import hashlib
+import os
+import re
+import threading
+from collections import Counter
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.read_only import ReadOnlyCell
+from openpyxl.utils import column_index_from_string
+# 按需读取直接使用 openpyxl 的内部接口（WorkSheetParser、ws._get_source()、ws._shared_strings、
+# wb._date_formats 等）以便一次遍历同时拿到值和格式；这些接口不保证跨版本稳定，
+# 所以 requirements.txt 把 openpyxl 限定在 3.1.x，升级前需重新验证本模块和 writer.py
+from openpyxl.worksheet._reader import WorkSheetParser
+
+from .diagnostics import Diagnostics
+from .projection import SheetView
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # 可选依赖：未安装时只能使用 openpyxl 读取
+    CalamineWorkbook = None
+
+# 格式概要只扫描前 100 行的数字格式
+FORMAT_SCAN_ROWS = 100
+# 内存中的 openpyxl 单元格每个大约占用的内存（字节），用于估算写出时的内存峰值
+CELL_BYTES = 400
+# 紧凑模式：不重复值不超过行数一半的文本列转为分类类型
+CATEGORY_MAX_RATIO = 0.5
+# 每个 sheet 最多缓存的视图结果数：工作簿在会话间共享，不同会话的筛选条件各占一项
+MAX_VIEWS = max(int(os.environ.get("SPLIT_MAX_VIEWS", 4)), 1)
+
+
+# --- 读取与缓存键 ---
+def file_digest(data):
+    """上传内容的哈希"""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def cache_key(digest, **options):
+    """文件哈希加读取参数组成缓存键，任一变化都会触发重新解析"""
+    return "|".join([digest] + [f"{k}={options[k]!r}" for k in sorted(options)])
+
+
+def _source(data):
+    # 既可以传入上传得到的字节，也可以直接传文件路径（命令行批处理）
+    return BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+
+
+def rows_to_df(rows):
+    # 第一行作表头，其余为数据
+    return pd.DataFrame(rows[1:], columns=rows[0]) if rows else pd.DataFrame()
+
+
+# --- 格式概要 ---
+# 每个 Sheet 解析时生成一次、随解析结果缓存，写出各组时按列套用：
+#   col_widths     {列字母: 列宽}
+#   header_height  表头行高；row_height 数据行的统一行高（多数数据行相同时才有）
+#   header_formats {列号: 表头的数字格式}；col_formats {列号: 该列数据的数字格式}
+#   freeze_panes   冻结窗格的左上角单元格，如 "A2"
+def layout_profile(col_widths, row_heights, number_formats, n_rows, freeze_panes=None):
+    """由列宽、{行号: 行高}、前 100 行的 (行号, 列号, 数字格式) 生成格式概要
+
+    分组后的行与原表行号不再对应，所以数字格式和行高都按列 / 按表头与数据行归纳，
+    数据行的数字格式取该列扫描范围内出现最多的一种。
+    """
+    header_formats, counts = {}, {}
+    for row_num, col_num, number_format in number_formats:
+        if row_num == 1:
+            header_formats[col_num] = number_format
+        else:
+            counts.setdefault(col_num, Counter())[number_format] += 1
+    heights = Counter(h for row_num, h in row_heights.items() if row_num > 1 and h is not None)
+    row_height = None
+    if heights:
+        height, n = heights.most_common(1)[0]
+        if n * 2 >= max(n_rows - 1, 1):
+            row_height = height
+    return {
+        "col_widths": col_widths,
+        "header_height": row_heights.get(1),
+        "row_height": row_height,
+        "header_formats": header_formats,
+        "col_formats": {col_num: c.most_common(1)[0][0] for col_num, c in sorted(counts.items())},
+        "freeze_panes": freeze_panes,
+    }
+
+
+def _views_freeze(views):
+    # 只读解析得到的 sheetViews 中冻结窗格的左上角单元格
+    for view in getattr(views, "sheetView", None) or []:
+        pane = view.pane
+        if pane is not None and pane.state in ("frozen", "frozenSplit") and pane.topLeftCell:
+            return pane.topLeftCell
+    return None
+
+
+def sheet_layout(ws):
+    """从完整模式的工作表中提取格式概要（见 layout_profile）"""
+    number_formats = []
+    for orig_row in ws.iter_rows(min_row=1, max_row=min(ws.max_row, FORMAT_SCAN_ROWS)):
+        for orig_cell in orig_row:
+            if orig_cell.number_format != 'General':
+                number_formats.append((orig_cell.row, orig_cell.column, orig_cell.number_format))
+    return layout_profile({col_letter: dim.width for col_letter, dim in ws.column_dimensions.items()},
+                       {row_num: dim.height for row_num, dim in ws.row_dimensions.items()},
+                       number_formats, ws.max_row, ws.freeze_panes)
+
+
+def parse_workbook(data, data_only=False, diag=None, compact=False):
+    """完整解析工作簿，返回 {sheet 名: {"df": DataFrame, "layout": 格式}}
+
+    写出只需要格式概要，取得 layout 后不再保留 openpyxl 工作表；
+    compact=True 时每个 sheet 解析后立即压缩（见 compact_item）。
+    """
+    diag = diag or Diagnostics()
+    with diag.stage("load"):
+        wb = load_workbook(_source(data), data_only=data_only)
+    sheet_data = {}
+    for s_name in wb.sheetnames:
+        ws = wb[s_name]
+        with diag.stage("df_build") as counts:
+            df = rows_to_df(list(ws.values))
+            sheet_data[s_name] = {"df": df, "layout": sheet_layout(ws)}
+            sheet_data[s_name]["nbytes"] = sheet_nbytes(sheet_data[s_name])
+            counts["rows"], counts["cells"] = len(df), df.size
+        if compact:
+            with diag.stage("compact"):
+                sheet_data[s_name] = compact_item(sheet_data[s_name])
+    return sheet_data
+
+
+def sheet_nbytes(item):
+    """一个已解析 sheet 占用的内存（DataFrame 的实际占用）"""
+    return int(item["df"].memory_usage(index=True, deep=True).sum())
+
+
+# --- 紧凑内存 ---
+def compact_column(col):
+    """低基数文本列转为分类，整数列无损缩小位宽；其余列（小数、日期、混合类型）保持不变"""
+    if pd.api.types.is_string_dtype(col.dtype):
+        # 混有 None 的 object 列转分类后 None 会变成 NaN，这类列保持不变
+        if col.map(type).isin([str, float]).all() and col.nunique() <= len(col) * CATEGORY_MAX_RATIO:
+            return col.astype("category")
+    elif pd.api.types.is_integer_dtype(col.dtype):
+        return pd.to_numeric(col, downcast="integer")
+    return col
+
+
+def compact_item(item):
+    """紧凑版本的已解析 sheet：列类型压缩，"saved" 为 DataFrame 节省的内存"""
+    df = item["df"]
+    if len(df):
+        # 按位置逐列处理，表头重名时也不会取到多列
+        df = pd.concat([compact_column(df.iloc[:, i]) for i in range(df.shape[1])], axis=1, ignore_index=True)
+        df.columns = item["df"].columns
+    compact = {"df": df, "layout": item["layout"]}
+    compact["nbytes"] = sheet_nbytes(compact)
+    compact["saved"] = max(item["nbytes"] - compact["nbytes"], 0)
+    return compact
+
+
+# --- 只读流式读取 ---
+def _sheet_parser(ws, src):
+    wb = ws.parent
+    return WorkSheetParser(src, ws._shared_strings, data_only=wb.data_only, epoch=wb.epoch,
+                           date_formats=wb._date_formats, timedelta_formats=wb._timedelta_formats)
+
+
+def _collect_formats(ws, row_num, cells, number_formats):
+    # 只记录前 100 行中非常规的数字格式
+    for c in cells:
+        if c["style_id"]:
+            fmt = ReadOnlyCell(ws, **c).number_format
+            if fmt != 'General':
+                number_formats.append((row_num, c["column"], fmt))
+
+
+def _pad_rows(rows, width):
+    for i, values in enumerate(rows):
+        if len(values) < width:
+            rows[i] = values + [None] * (width - len(values))
+    return rows
+
+
+def _make_layout(col_dims, row_dims, number_formats, n_rows, views=None):
+    return layout_profile({col_letter: float(attrs["width"]) if "width" in attrs else 13
+                        for col_letter, attrs in col_dims.items()},
+                       {int(row_num): float(attrs["ht"]) if "ht" in attrs else None
+                        for row_num, attrs in row_dims.items()},
+                       sorted(number_formats), n_rows, _views_freeze(views))
+
+
+def _sheet_item(rows, layout, select=None):
+    if select is not None:
+        layout = select.layout(layout)
+    item = {"df": rows_to_df(rows), "layout": layout}
+    item["nbytes"] = sheet_nbytes(item)
+    return item
+
+
+def _appender(select):
+    # 有视图时每行先筛选、投影再保留，未选中的列和行不会进入 DataFrame
+    return select.append if select is not None else list.append
+
+
+def stream_sheet(ws, select=None):
+    """逐行流式解析只读工作表，一次遍历同时得到 DataFrame 和格式
+
+    直接使用 openpyxl 只读模式内部的 WorkSheetParser，这样行高、列宽
+    能在同一次遍历中拿到，不必为了格式再完整加载一遍工作表。
+    select 为 SheetView 时只保留选中的列和满足筛选条件的行。
+    """
+    rows, width, number_formats = [], 0, []
+    append = _appender(select)
+    n_source = 0
+    with ws._get_source() as src:
+        parser = _sheet_parser(ws, src)
+        for row_num, cells in parser.parse():
+            if not cells:
+                continue
+            # 中间缺失的行补空行，与完整模式 ws.values 的结果保持一致
+            while n_source < row_num - 1:
+                append(rows, [])
+                n_source += 1
+            values = [None] * max(c["column"] for c in cells)
+            for c in cells:
+                values[c["column"] - 1] = c["value"]
+            if row_num <= FORMAT_SCAN_ROWS:
+                _collect_formats(ws, row_num, cells, number_formats)
+            append(rows, values)
+            n_source += 1
+        col_dims, row_dims, views = parser.column_dimensions, parser.row_dimensions, getattr(parser, "views", None)
+    width = max(map(len, rows), default=0)
+    return _sheet_item(_pad_rows(rows, width), _make_layout(col_dims, row_dims, number_formats, len(rows), views),
+                       select)
+
+
+# --- 快速读取后端 (calamine) ---
+# 单元格的值交给原生的 calamine 读取；格式只用 openpyxl 解析前 100 行，
+# 行高和数据区范围直接在原始 XML 上用正则统计，不再逐个解析单元格。
+_XML_CHUNK = 4 << 20
+_ROW_RE = re.compile(rb"<row\b([^>]*)>")
+_ATTR_RE = re.compile(rb'([\w:.-]+)="([^"]*)"')
+_FORMULA_RE = re.compile(rb"<f[\s>/]")
+_DIMENSION_RE = re.compile(rb'<dimension ref="(?:[A-Z]+\d+:)?([A-Z]+)\d+"')
+_CELL_TAGS = (b"<c ", b"<c>", b"<c/")
+
+
+# 可选的读取后端
+READERS = ("openpyxl", "calamine")
+
+
+def calamine_available():
+    return CalamineWorkbook is not None
+
+
+def _xml_chunks(src):
+    """分块读取工作表 XML，每块都在最后一个 "<" 处截断，保证标签不会被切开"""
+    carry = b""
+    while True:
+        data = src.read(_XML_CHUNK)
+        if not data:
+            if carry:
+                yield carry
+            return
+        data = carry + data
+        cut = data.rfind(b"<")
+        if cut <= 0:
+            carry = data
+            continue
+        carry = data[cut:]
+        yield data[:cut]
+
+
+def scan_sheet_xml(ws):
+    """不解析单元格，统计：是否含公式、行高（与 WorkSheetParser 的 row_dimensions 相同）、
+    最后一个有单元格的行号、dimension 声明的最大列号；标签带命名空间前缀时返回 None"""
+    row_dims, formulas, last_row, max_col, row_counter = {}, False, 0, 0, 0
+    plain = False
+    with ws._get_source() as src:
+        for chunk in _xml_chunks(src):
+            plain = plain or b"<sheetData" in chunk
+            if not max_col:
+                m = _DIMENSION_RE.search(chunk)
+                if m:
+                    max_col = column_index_from_string(m.group(1).decode())
+            formulas = formulas or bool(_FORMULA_RE.search(chunk))
+            cell_pos = max(chunk.rfind(tag) for tag in _CELL_TAGS)
+            cell_row = row_counter if cell_pos >= 0 else None
+            for m in _ROW_RE.finditer(chunk):
+                attrs = {k.decode(): v.decode() for k, v in _ATTR_RE.findall(m.group(1))}
+                row_counter = int(float(attrs["r"])) if "r" in attrs else row_counter + 1
+                if {k for k in attrs if ":" not in k} - {"r", "spans"}:
+                    row_dims[str(row_counter)] = attrs
+                if 0 <= m.start() < cell_pos:
+                    cell_row = row_counter
+            if cell_row:
+                last_row = cell_row
+    if not plain:
+        return None
+    return {"formulas": formulas, "row_dims": row_dims, "last_row": last_row, "max_col": max_col}
+
+
+def _calamine_value(value):
+    # 与 openpyxl 的结果对齐：空单元格为 None，整数不带小数，纯日期转为 datetime
+    if value == "":
+        return None
+    if type(value) is float and value.is_integer() and abs(value) < 1e15:
+        return int(value)
+    if type(value) is datetime.date:
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+def calamine_sheet(cal_wb, ws, data_only=False, select=None):
+    """calamine 读值 + openpyxl 轻量格式扫描，结果与 stream_sheet 相同
+
+    data_only=False 时含公式的工作表返回 None：calamine 只能读到公式的缓存值，
+    而原逻辑输出的是公式本身。XML 标签带命名空间前缀时也返回 None。
+    """
+    scan = scan_sheet_xml(ws)
+    if scan is None or (scan["formulas"] and not data_only):
+        return None
+    number_formats = []
+    with ws._get_source() as src:
+        parser = _sheet_parser(ws, src)
+        # 只解析前 100 行取数字格式；列宽和 sheetViews 在 sheetData 之前，此时也已读到
+        for row_num, cells in parser.parse():
+            if row_num > FORMAT_SCAN_ROWS:
+                break
+            _collect_formats(ws, row_num, cells, number_formats)
+        col_dims, views = parser.column_dimensions, getattr(parser, "views", None)
+
+    values = cal_wb.get_sheet_by_name(ws.title).to_python(skip_empty_area=False) if scan["last_row"] else []
+    rows, append = [], _appender(select)
+    for row in values[:scan["last_row"]]:
+        append(rows, [_calamine_value(v) for v in row])
+    # calamine 的范围只到最后一个有值的单元格，只有格式的单元格也要像 openpyxl 一样算进数据区
+    for _ in range(len(values), scan["last_row"]):
+        append(rows, [])
+    width = max(map(len, rows), default=0)
+    if rows and (select is None or select.keep is None):
+        width = max(width, scan["max_col"])
+    return _sheet_item(_pad_rows(rows, width), _make_layout(col_dims, scan["row_dims"], number_formats, len(rows),
+                                                             views), select)
+
+
+class LazyWorkbook:
+    """按需读取：先只列出 sheet 名和表头，数据只在 sheet 被选中时才解析
+
+    reader="calamine" 时单元格的值由 calamine 读取（需要安装 python-calamine），
+    含公式的 sheet 仍用 openpyxl 读取，以保证输出的是公式而不是缓存值。
+    compact=True 时每个 sheet 解析后立即压缩列类型（见 compact_item）。
+    sheets(names, view) 给出视图（见 projection.make_view）时，解析过程中就只保留选中的列和行；
+    每个 sheet 除完整结果外最多缓存 MAX_VIEWS 个最近使用的视图结果。
+    工作簿在会话间共享，解析统计记入调用方传入的 diag，而不是记在工作簿上。
+    """
+
+    def __init__(self, data, data_only=False, reader="openpyxl", compact=False, diag=None):
+        if reader not in READERS:
+            raise ValueError(f"未知的读取方式: {reader}")
+        if reader == "calamine" and not calamine_available():
+            raise ImportError("calamine 读取需要安装 python-calamine")
+        diag = diag or Diagnostics()
+        self.reader = reader
+        self.compact = compact
+        self._data = data
+        self._data_only = data_only
+        self._cal_wb = None
+        # 只读模式一直引用上传的原始字节，计入内存占用
+        self._source_bytes = len(data) if isinstance(data, (bytes, bytearray)) else 0
+        # 缓存在会话间共享，同一个只读工作簿不能被多个线程同时解析
+        self._lock = threading.Lock()
+        with diag.stage("load"):
+            self._wb = load_workbook(_source(data), read_only=True, data_only=data_only)
+            self.heads = {}
+            for s_name in self._wb.sheetnames:
+                first = list(next(self._wb[s_name].iter_rows(max_row=1, values_only=True), ()))
+                # 只读模式按工作表声明的范围补齐列，末尾的空表头不是真正的列
+                while first and first[-1] is None:
+                    first.pop()
+                self.heads[s_name] = first
+        self.sheet_data = {}
+
+    @property
+    def sheet_names(self):
+        return list(self.heads)
+
+    def sheets(self, names, view=None, diag=None):
+        """已解析的 {sheet 名: 解析结果}，未解析的 sheet 此时解析，耗时记入 diag"""
+        diag = diag or Diagnostics()
+        # 筛选列不存在时在解析前就抛出 ValueError
+        selects = {s_name: SheetView(view, self.heads[s_name], s_name) for s_name in names} if view else {}
+        with self._lock:
+            for s_name in names:
+                key = s_name if view is None else (s_name, view)
+                if view is not None and key in self.sheet_data:
+                    _touch_view(self.sheet_data, key)
+                if key not in self.sheet_data:
+                    with diag.stage("df_build") as counts:
+                        item = self._read_sheet(s_name, selects.get(s_name))
+                        counts["rows"], counts["cells"] = len(item["df"]), item["df"].size
+                    if self.compact:
+                        with diag.stage("compact"):
+                            item = compact_item(item)
+                    if view is None:
+                        # 解析后以 DataFrame 的实际列为准
+                        self.heads[s_name] = item["df"].columns.tolist()
+                    self.sheet_data[key] = item
+                    if view is not None:
+                        _evict_views(self.sheet_data, s_name)
+            return {s_name: self.sheet_data[s_name if view is None else (s_name, view)] for s_name in names}
+
+    def _read_sheet(self, s_name, select=None):
+        ws = self._wb[s_name]
+        if self.reader == "calamine":
+            if self._cal_wb is None:
+                self._cal_wb = CalamineWorkbook.from_object(_source(self._data))
+            item = calamine_sheet(self._cal_wb, ws, self._data_only, select)
+            if item is not None:
+                return item
+        return stream_sheet(ws, select)
+
+    def memory_usage(self):
+        return self._source_bytes + sum(item["nbytes"] for item in list(self.sheet_data.values()))
+
+    def saved_bytes(self):
+        """紧凑模式相对常规解析节省的内存"""
+        return sum(item.get("saved", 0) for item in list(self.sheet_data.values()))
+
+
+
+class EagerWorkbook:
+    """完整读取：一次解析全部 sheet
+
+    数据已全部在内存中，视图在已解析的 DataFrame 上筛选、投影，结果同样按 sheet 缓存最近使用的几个。
+    """
+
+    def __init__(self, data, data_only=False, compact=False, diag=None):
+        self.compact = compact
+        self.sheet_data = parse_workbook(data, data_only=data_only, diag=diag, compact=compact)
+        self.heads = {s_name: item["df"].columns.tolist() for s_name, item in self.sheet_data.items()}
+        self._views = {}
+        self._lock = threading.Lock()
+
+    @property
+    def sheet_names(self):
+        return list(self.heads)
+
+    def sheets(self, names, view=None, diag=None):
+        if view is None:
+            return {s_name: self.sheet_data[s_name] for s_name in names}
+        diag = diag or Diagnostics()
+        selects = {s_name: SheetView(view, self.heads[s_name], s_name) for s_name in names}
+        with self._lock:
+            for s_name in names:
+                if (s_name, view) in self._views:
+                    _touch_view(self._views, (s_name, view))
+                else:
+                    with diag.stage("project") as counts:
+                        item = self.sheet_data[s_name]
+                        df = selects[s_name].frame(item["df"])
+                        viewed = {"df": df, "layout": selects[s_name].layout(item["layout"])}
+                        viewed["nbytes"] = sheet_nbytes(viewed)
+                        counts["rows"], counts["cells"] = len(df), df.size
+                    self._views[(s_name, view)] = viewed
+                    _evict_views(self._views, s_name)
+            return {s_name: self._views[(s_name, view)] for s_name in names}
+
+    def memory_usage(self):
+        return sum(item["nbytes"] for item in list(self.sheet_data.values()) + list(self._views.values()))
+
+    def saved_bytes(self):
+        return sum(item.get("saved", 0) for item in self.sheet_data.values())
+
+
+def _touch_view(cache, key):
+    # 命中的视图移到最后，淘汰时按最近使用的先后
+    cache[key] = cache.pop(key)
+
+
+def _evict_views(cache, s_name, limit=MAX_VIEWS):
+    # 同一 sheet 的视图结果超过 limit 个时释放最久未用的；占用计入 memory_usage，由解析缓存统一核算预算
+    keys = [k for k in cache if isinstance(k, tuple) and k[0] == s_name]
+    for key in keys[:max(len(keys) - limit, 0)]:
+        del cache[key]
+
+
+def open_workbook(data, lazy=False, data_only=False, reader="openpyxl", compact=False, diag=None):
+    """lazy=False 时完整读取（只能用 openpyxl）；reader 只对按需读取生效；compact 为紧凑内存模式
+
+    打开时的解析耗时记入 diag。
+    """
+    if lazy:
+        return LazyWorkbook(data, data_only=data_only, reader=reader, compact=compact, diag=diag)
+    return EagerWorkbook(data, data_only=data_only, compact=compact, diag=diag)
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 整个服务进程同时运行的分表任务上限，超出的任务排队等待
+MAX_JOBS = int(os.environ.get("SPLIT_MAX_JOBS", 2))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_JOBS, thread_name_prefix="split-job")
+_queue = []
+_queue_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """后台分表任务：记录进度与结果，支持取消
+
+    target(progress) 在共用线程池中执行；target 每完成一个输出调用 progress(已完成数)，
+    取消后下一次 progress 调用会抛出 JobCancelled 终止任务。
+    """
+
+    def __init__(self, target, total=0):
+        self.target = target
+        self.total = total
+        self.done = 0
+        self.status = "queued"  # queued / running / done / failed / cancelled
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        # 批量分表时各文件的状态 {文件名: {"status", "done", "total", "seconds"}}
+        self.files = {}
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def progress(self, done, total=None):
+        """total 在开始时还不知道（例如批量分表逐个文件统计）时，可以随进度一起更新"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if total is not None:
+            self.total = total
+        self.done = done
+
+    def cancel(self):
+        self._cancel.set()
+        with _queue_lock:
+            if self in _queue:
+                # 还没开始的任务直接出队
+                _queue.remove(self)
+                self.status = "cancelled"
+
+    def queue_position(self):
+        """排在前面的任务数（不在队列中时为 0）"""
+        with _queue_lock:
+            return _queue.index(self) if self in _queue else 0
+
+    def eta(self):
+        """按已完成部分的平均速度估算剩余秒数，尚无进度时返回 None"""
+        if self.status != "running" or not self.done or not self.total:
+            return None
+        elapsed = time.perf_counter() - self.started
+        return elapsed / self.done * max(self.total - self.done, 0)
+
+    def _run(self):
+        with _queue_lock:
+            if self not in _queue:
+                return
+            _queue.remove(self)
+            self.status = "running"
+        self.started = time.perf_counter()
+        try:
+            self.result = self.target(self.progress)
+            self.status = "done"
+        except JobCancelled:
+            self.status = "cancelled"
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+        finally:
+            self.finished = time.perf_counter()
+
+
+def submit(target, total=0):
+    """提交到共用线程池，返回 Job；同时运行的任务数不超过 MAX_JOBS"""
+    job = Job(target, total)
+    with _queue_lock:
+        _queue.append(job)
+    _executor.submit(job._run)
+    return job
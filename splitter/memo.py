@@ -0,0 +1,114 @@
+import io
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+
+# 分组结果缓存的总内存预算（MB），整个服务进程内共享
+MEMO_BUDGET_MB = int(os.environ.get("SPLIT_MEMO_MB", 256))
+
+
+class OutputMemo:
+    """按内容寻址的分组结果缓存：分组索引、ZIP 成员工作簿、单文件结果
+
+    键以工作簿缓存键（内容哈希加读取参数）开头，只改命名或打包方式时可以直接复用。
+    超出预算时按 LRU 淘汰；单项超过预算 1/4 的结果不缓存，以免挤掉其他结果。
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._items = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def accepts(self, nbytes):
+        """nbytes 大小的结果是否会被缓存（单项不超过预算的 1/4）"""
+        return nbytes <= self.budget_bytes // 4
+
+    def put(self, key, value, nbytes):
+        if not self.accepts(nbytes):
+            return
+        with self._lock:
+            if key in self._items:
+                self._nbytes -= self._items.pop(key)[1]
+            self._items[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.budget_bytes:
+                self._nbytes -= self._items.popitem(last=False)[1][1]
+
+
+output_memo = OutputMemo(MEMO_BUDGET_MB * 2 ** 20)
+
+
+class RunMemo:
+    """一次分表运行对 output_memo 的访问，统计本次各类结果的命中情况"""
+
+    def __init__(self, source, store=output_memo):
+        self.source = source
+        self.store = store
+        self.counts = {}
+
+    def lookup(self, kind, *parts):
+        """返回 (缓存键, 已缓存的值或 None)"""
+        key = (kind, self.source) + parts
+        value = self.store.get(key)
+        self.counts.setdefault(kind, [0, 0])[0 if value is not None else 1] += 1
+        return key, value
+
+    def put(self, key, value, nbytes):
+        self.store.put(key, value, nbytes)
+
+    def accepts(self, nbytes):
+        return self.store.accepts(nbytes)
+
+    def cached(self, kind, parts, compute, nbytes):
+        key, value = self.lookup(kind, *parts)
+        if value is None:
+            value = compute()
+            self.put(key, value, nbytes(value))
+        return value
+
+    def summary(self):
+        return {kind: {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 3)}
+                for kind, (hits, misses) in self.counts.items()}
+
+
+def group_token(name):
+    """分组值的缓存键：同时记录类型，避免 1 和 "1" 这样字符串相同的不同分组混用结果"""
+    values = name if isinstance(name, tuple) else (name,)
+    return tuple((type(v).__name__, str(v)) for v in values)
+
+
+def index_nbytes(indices):
+    return sum(positions.nbytes for positions in indices.values()) + 100 * len(indices)
+
+
+# --- 单文件结果改名 ---
+_SHEET_NAME_RE = re.compile(rb'(<sheet\b[^>]*?\bname=")([^"]*)(")')
+
+
+def rename_sheets(data, titles):
+    """只改写 xl/workbook.xml 中的 Sheet 名，其余部件原样复制，不重新生成工作表"""
+    it = iter(titles)
+
+    def replace(m):
+        return m.group(1) + escape(next(it), {'"': "&quot;"}).encode("utf-8") + m.group(3)
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as zin, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            content = zin.read(info)
+            if info.filename == "xl/workbook.xml":
+                content = _SHEET_NAME_RE.sub(replace, content)
+            zout.writestr(info, content)
+    return out.getvalue()
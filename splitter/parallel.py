@@ -0,0 +1,77 @@
+import atexit
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+
+from .diagnostics import Diagnostics
+from .writer import render_workbook
+
+# 进程池在整个服务进程内共用，避免每次分表都重新启动子进程；池按最大可选进程数创建一次，
+# 各次分表通过在途任务数限制自己占用的进程，不会因某次分表要求更多进程而关闭别的会话正在用的池
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def worker_choices():
+    """可选的并行进程数，不超过 CPU 核数"""
+    cpus = os.cpu_count() or 1
+    return [n for n in (1, 2, 4, 8, 16) if n <= cpus] or [1]
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn 在各平台行为一致，也不会把 Streamlit 的线程状态 fork 进子进程；
+            # 子进程按需启动，只用到少量进程时不会一次启动全部
+            _pool = ProcessPoolExecutor(max_workers=max(worker_choices()), mp_context=get_context("spawn"))
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_workbooks(jobs, workers=1, streaming=False, diag=None, fmt="styled"):
+    """依次产出 (文件名, 文件字节)，顺序与 jobs 一致
+
+    jobs 为 (文件名, [(sheet 名, layout, DataFrame), ...]) 的可迭代对象；第二项已是
+    xlsx 字节（缓存命中）时不再生成，原样按顺序产出。
+    workers > 1 时交给共用进程池并行生成，同时在途的任务不超过 workers 个，
+    结果按提交顺序取回，所以 ZIP 内文件顺序与串行时相同，内存占用也有上限。
+    并行时子进程内的细分耗时无法取回，诊断中只记录等待结果的 render.wait。
+    fmt 为输出格式（见 writer.OUTPUT_FORMATS），CSV / Parquet 时每个任务只含一张表。
+    """
+    diag = diag or Diagnostics()
+    if workers <= 1:
+        for file_name, sheets in jobs:
+            yield file_name, sheets if isinstance(sheets, bytes) else render_workbook(sheets, streaming, diag, fmt)
+        return
+
+    pool = _get_pool()
+    pending = deque()
+    try:
+        for file_name, sheets in jobs:
+            if isinstance(sheets, bytes):
+                future = Future()
+                future.set_result(sheets)
+            else:
+                future = pool.submit(render_workbook, sheets, streaming, None, fmt)
+            pending.append((file_name, future))
+            if len(pending) >= workers:
+                name, future = pending.popleft()
+                with diag.stage("render.wait"):
+                    data = future.result()
+                yield name, data
+        while pending:
+            name, future = pending.popleft()
+            with diag.stage("render.wait"):
+                data = future.result()
+            yield name, data
+    finally:
+        for _, future in pending:
+            future.cancel()
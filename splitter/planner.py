@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .engine import MODES, NAME_LIMIT, file_outputs, full_name, output_ext, part_sizes, sheet_outputs
+from .ingest import CELL_BYTES
+from .writer import OUTPUT_FORMATS
+
+# 超过提示阈值时提醒，超过上限时拒绝开始分表（上限可用环境变量调整）
+WARN_OUTPUTS = 1000
+MAX_OUTPUTS = int(os.environ.get("SPLIT_MAX_OUTPUTS", 20000))
+WARN_OUTPUT_MB = 500
+MAX_OUTPUT_MB = int(os.environ.get("SPLIT_MAX_OUTPUT_MB", 4096))
+WARN_PEAK_MB = 1024
+MAX_PEAK_MB = int(os.environ.get("SPLIT_MAX_PEAK_MB", 4096))
+
+# 估算每行输出大小时抽样的行数
+SAMPLE_ROWS = 2000
+# 每个单元格在 xlsx XML 中除值以外的开销（<c r=".." s=".."><v>..</v></c>），以及各格式的压缩比
+XLSX_CELL_XML = 24
+COMPRESSION = {"styled": 0.22, "xlsx": 0.22, "csv": 0.37, "parquet": 0.6}
+# 每个输出文件 / 工作表的固定开销（字节）
+FILE_OVERHEAD = {"styled": 5000, "xlsx": 4500, "csv": 150, "parquet": 1500}
+SHEET_OVERHEAD = 1200
+# 已保存但尚未被垃圾回收的 openpyxl 单元格的内存（字节/单元格），远小于生成时的 CELL_BYTES
+RETAINED_CELL_BYTES = 90
+
+
+def _text_bytes(df):
+    # 均匀抽样估算一行的文本长度，全程向量化
+    if df.empty or not df.shape[1]:
+        return 0.0
+    sample = df.iloc[::max(len(df) // SAMPLE_ROWS, 1)]
+    return float(sum(sample.iloc[:, i].astype(str).str.len().mean() for i in range(sample.shape[1])))
+
+
+def row_bytes(df, fmt="styled"):
+    """一行数据写出后（压缩后）的估算字节数"""
+    text = _text_bytes(df)
+    if fmt in ("styled", "xlsx"):
+        text += XLSX_CELL_XML * df.shape[1]
+    elif fmt == "csv":
+        text += df.shape[1]
+    return text * COMPRESSION[fmt]
+
+
+def _mb(nbytes):
+    return round(nbytes / 1024 / 1024, 1)
+
+
+def plan_split(sheet_data, selected_sheets, group_columns, mode, fmt="styled", prefix="", suffix="",
+               sheet_in_name=True, groups=None, memo=None, part_rows=None, part_mb=None, streaming=False, workers=1,
+               target_in_memory=False):
+    """分表的预演：不写任何单元格，给出输出清单和资源估算
+
+    输出名称与 run_split 使用同一套计划函数（重名已追加序号），每个输出的行数由分组索引
+    直接取得；大小和内存按各 Sheet 的抽样行宽向量化估算。页面和命令行把结果写到磁盘文件，
+    结果写入 BytesIO 时传 target_in_memory=True，内存峰值中计入整个结果。返回
+    {"outputs": DataFrame[名称, 行数, 估算 MB], "count", "rows", "bytes", "peak_bytes",
+     "renamed", "truncated", "warnings", "errors"}；errors 非空时不应开始分表。
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的输出方式: {mode}")
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"未知的输出格式: {fmt}")
+    sizes = part_sizes(sheet_data, selected_sheets, part_rows, part_mb, fmt)
+    sheet_pos = {s: i for i, s in enumerate(selected_sheets)}
+    names, out_idx, sheet_idx, n_rows = [], [], [], []
+    renamed = truncated = 0
+
+    if mode == "sheets":
+        items = ((title, base, full_name(prefix, suffix, name, s_name if sheet_in_name else ""), [(s_name, positions)])
+                 for title, base, s_name, name, positions, _ in sheet_outputs(sheet_data, selected_sheets, group_columns,
+                                                                              prefix, suffix, sheet_in_name, memo, sizes))
+    else:
+        items = ((stem, base, full_name(prefix, suffix, name), chunks)
+                 for stem, base, name, chunks, _ in file_outputs(sheet_data, selected_sheets, group_columns, mode,
+                                                                 prefix, suffix, groups, memo, sizes))
+    for i, (name, base, full, chunks) in enumerate(items):
+        names.append(name)
+        renamed += name != base
+        truncated += len(full.strip("_- ")) > NAME_LIMIT
+        for s_name, positions in chunks:
+            out_idx.append(i)
+            sheet_idx.append(sheet_pos[s_name])
+            n_rows.append(len(positions))
+
+    count = len(names)
+    out_idx, sheet_idx = np.asarray(out_idx, dtype=np.int64), np.asarray(sheet_idx, dtype=np.int64)
+    n_rows = np.asarray(n_rows, dtype=np.float64)
+    frames = [sheet_data[s]["df"] for s in selected_sheets]
+    widths = np.array([df.shape[1] for df in frames], dtype=np.float64)
+    per_row = np.array([row_bytes(df, fmt) for df in frames], dtype=np.float64)
+    # 解析后 DataFrame 每行的内存占用，分组切片时会复制一份
+    mem_row = np.array([df.memory_usage(index=False, deep=True).sum() / len(df) if len(df) else 0.0
+                        for df in frames], dtype=np.float64)
+
+    rows = np.bincount(out_idx, weights=n_rows, minlength=count)
+    cells = np.bincount(out_idx, weights=n_rows * widths[sheet_idx], minlength=count)
+    sheets_per_output = np.bincount(out_idx, minlength=count)
+    out_bytes = np.bincount(out_idx, weights=n_rows * per_row[sheet_idx], minlength=count) \
+        + SHEET_OVERHEAD * sheets_per_output
+    slice_bytes = np.bincount(out_idx, weights=n_rows * mem_row[sheet_idx], minlength=count)
+    single_file = output_ext(mode, fmt) == ".xlsx"
+    if not single_file:
+        out_bytes = out_bytes + FILE_OVERHEAD[fmt]
+    total_bytes = float(out_bytes.sum()) + (FILE_OVERHEAD[fmt] if single_file else 0)
+
+    # 内存峰值（在已解析数据之外）：标准写入单文件时全部 openpyxl 单元格都留在内存中；ZIP 时是同时在
+    # 生成的几个工作簿，加上已保存、但因循环引用要等完整垃圾回收才释放的单元格。流式写入和纯数据格式
+    # 只需要分组切片。结果写到文件时不占内存，写入 BytesIO 时整个结果都在内存中
+    in_memory = fmt == "styled" and not streaming
+    if not count:
+        peak = 0.0
+    elif single_file:
+        peak = float(cells.sum()) * CELL_BYTES if in_memory else float(slice_bytes.max())
+    else:
+        # 每个 ZIP 成员先在内存中生成完整的字节，再写入 ZIP
+        per_output = slice_bytes + out_bytes + (cells * CELL_BYTES if in_memory else 0)
+        peak = float(np.sort(per_output)[-max(min(workers, count), 1):].sum())
+        if in_memory:
+            peak += float(cells.sum()) * RETAINED_CELL_BYTES
+    if count and target_in_memory:
+        peak += total_bytes
+    # 只有标准写入的带格式结果才能靠改用流式写入降低内存
+    peak_hint = "请改用流式写入、无样式格式或分片" if in_memory else "请筛选行、减少输出列或减少并行进程数"
+
+    warnings, errors = [], []
+    if not count:
+        errors.append("没有可输出的分组（检查分组列和筛选条件）")
+    if count > MAX_OUTPUTS:
+        errors.append(f"将生成 {count} 个输出，超过上限 {MAX_OUTPUTS}，请减少分组列或先筛选")
+    elif count > WARN_OUTPUTS:
+        kind = "Sheet" if single_file else "文件"
+        warnings.append(f"将生成 {count} 个{kind}，打开和解压都会较慢")
+    if total_bytes > MAX_OUTPUT_MB * 2 ** 20:
+        errors.append(f"结果约 {_mb(total_bytes)} MB，超过上限 {MAX_OUTPUT_MB} MB，请筛选行或减少输出列")
+    elif total_bytes > WARN_OUTPUT_MB * 2 ** 20:
+        warnings.append(f"结果约 {_mb(total_bytes)} MB，生成和下载需要较长时间")
+    if peak > MAX_PEAK_MB * 2 ** 20:
+        errors.append(f"预计内存峰值约 {_mb(peak)} MB，超过上限 {MAX_PEAK_MB} MB，{peak_hint}")
+    elif peak > WARN_PEAK_MB * 2 ** 20:
+        warnings.append(f"预计内存峰值约 {_mb(peak)} MB，" + ("建议使用流式写入" if in_memory else "请留意服务器内存"))
+    if renamed:
+        warnings.append(f"{renamed} 个名称与前面的输出重名，已自动追加序号")
+    if truncated:
+        warnings.append(f"{truncated} 个名称超过 {NAME_LIMIT} 个字符，已截断")
+
+    outputs = pd.DataFrame({"名称": names, "行数": rows.astype(np.int64),
+                            "估算 MB": np.round(out_bytes / 2 ** 20, 3)})
+    return {"outputs": outputs, "count": count, "rows": int(rows.sum()), "bytes": int(total_bytes),
+            "peak_bytes": int(peak), "renamed": int(renamed), "truncated": int(truncated),
+            "warnings": warnings, "errors": errors}
@@ -0,0 +1,163 @@
+import datetime
+import numbers
+import re
+
+import pandas as pd
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.cell import coordinate_from_string
+
+# 行筛选的运算符 {显示名: 运算符}
+FILTER_OPS = {"等于": "eq", "不等于": "ne", "包含": "contains", "大于等于": "ge", "小于等于": "le", "介于": "between"}
+# 等于 / 不等于 可填多个值（任一相等即算相等）；介于 用 ~ 连接上下限（含两端）
+_LIST_SEP = re.compile(r"[,，]")
+_RANGE_SEP = re.compile(r"[~～]")
+
+
+# --- 视图：输出列与行筛选 ---
+def make_view(columns=None, filters=()):
+    """输出列与行筛选组成的视图，可哈希，作为解析缓存和分组缓存键的一部分
+
+    columns 为保留的表头（None 为全部列），filters 为 [(列, 运算符, 值文本)...]，多个条件同时满足。
+    不投影也不筛选时返回 None；筛选值无法解析时抛出 ValueError。
+    """
+    columns = tuple(columns) if columns else None
+    filters = tuple((col, op, str(text).strip()) for col, op, text in filters)
+    for col, op, text in filters:
+        RowFilter(op, text)
+    if columns is None and not filters:
+        return None
+    return columns, filters
+
+
+def view_source(source, view):
+    """分组缓存的来源键：筛选或投影后的分组与原表不同，键中带上视图"""
+    return source if view is None or source is None else (source, view)
+
+
+def _as_datetime(value):
+    if type(value) is datetime.date:
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+class RowFilter:
+    """单个筛选条件：筛选值按单元格的类型解释为日期、数字或文本，无法转换时按文本比较"""
+
+    def __init__(self, op, text):
+        if op not in FILTER_OPS.values():
+            raise ValueError(f"未知的筛选运算符: {op}")
+        if op == "between":
+            bounds = [t.strip() for t in _RANGE_SEP.split(text)]
+            if len(bounds) != 2 or not all(bounds):
+                raise ValueError(f"「介于」的值应为 下限~上限: {text}")
+            self.texts = bounds
+        elif op in ("eq", "ne"):
+            self.texts = [t.strip() for t in _LIST_SEP.split(text)]
+        else:
+            self.texts = [text]
+        self.op = op
+        # 每种单元格类型只转换一次筛选值
+        self._targets = {}
+
+    def _targets_for(self, value):
+        kind = type(value)
+        if kind not in self._targets:
+            try:
+                if isinstance(value, (datetime.datetime, datetime.date)):
+                    targets = [pd.Timestamp(t).to_pydatetime() for t in self.texts]
+                elif isinstance(value, numbers.Number) and not isinstance(value, bool):
+                    targets = [float(t) for t in self.texts]
+                else:
+                    targets = None
+            except (ValueError, TypeError):
+                targets = None
+            self._targets[kind] = targets
+        return self._targets[kind]
+
+    def __call__(self, value):
+        if self.op == "contains":
+            return value is not None and self.texts[0] in str(value)
+        if value is None:
+            return self.op == "ne"
+        targets = self._targets_for(value)
+        if targets is None:
+            value, targets = str(value), self.texts
+        elif isinstance(value, datetime.date):
+            value = _as_datetime(value)
+        if self.op == "eq":
+            return value in targets
+        if self.op == "ne":
+            return value not in targets
+        if self.op == "ge":
+            return value >= targets[0]
+        if self.op == "le":
+            return value <= targets[0]
+        return targets[0] <= value <= targets[1]
+
+
+class SheetView:
+    """视图落到一个 sheet 上：按表头算出保留的列位置和筛选条件，读取时逐行应用"""
+
+    def __init__(self, view, head, sheet=""):
+        columns, filters = view
+        head = list(head)
+        if columns is None:
+            self.keep = None
+        else:
+            wanted = set(columns)
+            self.keep = [i for i, name in enumerate(head) if name in wanted]
+        self.tests = []
+        if all(name is None for name in head):
+            # 空表没有表头，原样保留（仍为空）
+            self.keep = None
+            return
+        for col, op, text in filters:
+            if col not in head:
+                raise ValueError(f"筛选列「{col}」不在 Sheet「{sheet}」中")
+            self.tests.append((head.index(col), RowFilter(op, text)))
+
+    def accepts(self, values):
+        return all(test(values[i] if i < len(values) else None) for i, test in self.tests)
+
+    def project(self, values):
+        if self.keep is None:
+            return values
+        return [values[i] if i < len(values) else None for i in self.keep]
+
+    def append(self, rows, values):
+        """把一行源数据加入 rows：第一行（表头）只投影，数据行先筛选再投影"""
+        if rows and not self.accepts(values):
+            return
+        rows.append(self.project(values))
+
+    def frame(self, df):
+        """已解析的 DataFrame 上应用视图（完整读取时数据已在内存中，只能事后筛选）"""
+        if self.tests:
+            mask = pd.Series(True, index=df.index)
+            for i, test in self.tests:
+                # 完整读取时空单元格是 NaN / NaT，按需读取时是 None，统一成 None 后两种读取的筛选结果相同
+                mask &= df.iloc[:, i].map(lambda value: test(None if pd.isna(value) else value)).astype(bool)
+            df = df[mask.to_numpy()].reset_index(drop=True)
+        if self.keep is not None:
+            df = df.iloc[:, self.keep]
+        return df
+
+    def layout(self, layout):
+        """格式概要中的列号、列字母和冻结窗格换算到投影后的位置"""
+        if self.keep is None:
+            return layout
+        pos = {orig + 1: new + 1 for new, orig in enumerate(self.keep)}
+        widths = {}
+        for col_letter, width in layout["col_widths"].items():
+            col_num = column_index_from_string(col_letter)
+            if col_num in pos:
+                widths[get_column_letter(pos[col_num])] = width
+        freeze = layout["freeze_panes"]
+        if freeze:
+            col_letter, row_num = coordinate_from_string(freeze)
+            col_num = column_index_from_string(col_letter)
+            freeze = f"{get_column_letter(1 + sum(1 for orig in pos if orig < col_num))}{row_num}"
+            freeze = None if freeze == "A1" else freeze
+        return dict(layout, col_widths=widths, freeze_panes=freeze,
+                    header_formats={pos[c]: f for c, f in layout["header_formats"].items() if c in pos},
+                    col_formats={pos[c]: f for c, f in layout["col_formats"].items() if c in pos})
@@ -0,0 +1,315 @@
+import functools
+import os
+
+import pandas as pd
+import streamlit as st
+
+from . import jobs
+from .batch import file_stems, split_batch
+from .cache import workbook_cache
+from .diagnostics import Diagnostics
+from .engine import count_outputs, run_split
+from .ingest import cache_key, calamine_available, file_digest, open_workbook
+from .memo import RunMemo
+from .parallel import worker_choices
+from .projection import FILTER_OPS, make_view
+from .store import ResultStore, read_file
+from .writer import parquet_available
+
+
+# 每个会话最多记住的上传哈希数（批量上传时同时有多个文件）
+MAX_UPLOAD_DIGESTS = 64
+
+
+def upload_digest(uploaded_file):
+    """上传文件的内容哈希；同一次上传的 file_id 不变，按 file_id 记住结果，避免每次重跑都对整个文件求哈希"""
+    file_id = getattr(uploaded_file, "file_id", None)
+    digests = st.session_state.setdefault("_upload_digests", {})
+    if file_id is None:
+        return file_digest(uploaded_file.getvalue())
+    if file_id not in digests:
+        if len(digests) >= MAX_UPLOAD_DIGESTS:
+            digests.clear()
+        digests[file_id] = file_digest(uploaded_file.getvalue())
+    return digests[file_id]
+
+
+def parse_diagnostics():
+    """当前会话的解析统计：解析发生在上传和选 Sheet 时，先记在会话里，点击分表时并入本次运行的诊断
+
+    工作簿在会话间共享，只有真正触发解析的会话记下耗时，缓存命中的会话不会看到别人的解析统计。
+    """
+    return st.session_state.setdefault("_parse_diag", Diagnostics())
+
+
+def take_parse_diagnostics():
+    """取出自上次取出以来本会话的解析统计"""
+    return st.session_state.pop("_parse_diag", None) or Diagnostics()
+
+
+def cached_workbook(uploaded_file, lazy=False, data_only=False, reader="openpyxl", compact=False):
+    """按上传内容哈希缓存解析结果，控件交互引起的重跑不再重复解析
+
+    缓存在整个服务进程内共享，不同会话上传同一份文件只解析一次、只占一份内存；
+    会话里不保留工作簿引用，淘汰后才能真正释放。按需读取模式下已解析的 sheet
+    也保存在同一个对象里，换选 sheet 只解析新增的部分。解析耗时记入 parse_diagnostics()。
+    """
+    key = cache_key(upload_digest(uploaded_file), lazy=lazy, data_only=data_only, reader=reader, compact=compact)
+
+    def load():
+        book = open_workbook(uploaded_file.getvalue(), lazy=lazy, data_only=data_only, reader=reader, compact=compact,
+                             diag=parse_diagnostics())
+        # 分组结果缓存以工作簿缓存键为前缀
+        book.cache_key = key
+        return book
+
+    return workbook_cache.get(key, load)
+
+
+def result_store():
+    """当前会话的结果目录，会话结束或超过 TTL 后自动清理"""
+    if "_result_store" not in st.session_state:
+        st.session_state["_result_store"] = ResultStore()
+    return st.session_state["_result_store"]
+
+
+def result_ready(res):
+    # 结果文件可能已被 TTL 清理
+    return bool(res) and os.path.exists(res["path"])
+
+
+# 诊断面板中各阶段的中文名称
+STAGE_LABELS = {
+    "load": "读取工作簿",
+    "df_build": "构建 DataFrame",
+    "compact": "紧凑压缩",
+    "project": "列投影与筛选",
+    "merge": "合并文件",
+    "groupby": "分组与计划",
+    "write.cells": "写入单元格",
+    "write.styles": "套用样式",
+    "export": "导出 CSV / Parquet",
+    "save": "保存工作簿",
+    "render.wait": "等待并行生成",
+    "zip": "ZIP 压缩",
+    "memo.rename": "复用结果并改名",
+}
+
+def format_options():
+    """页面上的输出格式选项 {显示名: writer 的格式名}；未安装 pyarrow 时不提供 Parquet"""
+    options = {"格式: 带样式 xlsx": "styled", "格式: 无样式 xlsx": "xlsx", "格式: CSV (ZIP)": "csv"}
+    if parquet_available():
+        options["格式: Parquet (ZIP)"] = "parquet"
+    return options
+
+
+def view_controls(columns, group_columns):
+    """“输出列与筛选”面板，返回视图（见 projection.make_view），不投影也不筛选时为 None
+
+    只选部分输出列时分组列总会保留；筛选值无法解析时显示错误并停止页面。
+    """
+    with st.expander("输出列与筛选"):
+        out_columns = st.multiselect("OC", options=columns, placeholder="输出列（默认全部列，分组列总会保留）")
+        f1, f2, f3 = st.columns([1.2, 0.8, 1.5])
+        filter_col = f1.selectbox("FC", [None] + [c for c in columns if c is not None],
+                                  format_func=lambda c: "筛选: 不筛选" if c is None else f"筛选: {c}")
+        op = f2.selectbox("FO", list(FILTER_OPS))
+        text = f3.text_input("FV", placeholder="筛选值：多个值用逗号分隔，介于 用 ~ 连接，日期如 2024-01-31")
+    keep = [c for c in columns if c in out_columns or c in group_columns] if out_columns else None
+    filters = [(filter_col, FILTER_OPS[op], text)] if filter_col is not None and text.strip() else []
+    try:
+        return make_view(keep, filters)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+
+def show_plan(plan):
+    """分表预演面板（见 planner.plan_split）：输出清单、估算大小和内存，以及提示；超过上限时返回 False"""
+    size_mb, peak_mb = plan["bytes"] / 1024 / 1024, plan["peak_bytes"] / 1024 / 1024
+    with st.expander(f"分表计划：{plan['count']} 个输出，共 {plan['rows']} 行，约 {size_mb:.2f} MB"):
+        st.caption(f"结果大小和内存峰值为估算值；分表时内存峰值约 {peak_mb:.1f} MB（不含已解析的数据）")
+        st.dataframe(plan["outputs"], hide_index=True, use_container_width=True)
+    for message in plan["warnings"]:
+        st.warning(message)
+    for message in plan["errors"]:
+        st.error(message)
+    return not plan["errors"]
+
+
+# 分片选项 {显示名: (每片行数, 每片 MB)}；“MB” 按解析后的内存占用估算
+PART_OPTIONS = {
+    "分片: 不分片": (None, None),
+    "分片: 每片 10 万行": (100000, None),
+    "分片: 每片 50 万行": (500000, None),
+    "分片: 每片约 20 MB": (None, 20),
+    "分片: 每片约 100 MB": (None, 100),
+}
+
+
+def advanced_options():
+    """“高级选项”面板，三个分表页面共用；返回各项设置
+
+    {"lazy", "reader", "compact", "streaming", "part_rows", "part_mb", "workers", "trace_memory"}
+    """
+    with st.expander("高级选项"):
+        # 安装了 python-calamine 时可选快速读取：值由 calamine 读取，格式仍由 openpyxl 提取
+        read_mode = st.radio("R", ["按需读取 (只解析选中的 Sheet)", "完整读取"] + (["快速读取 (calamine)"] if calamine_available() else []), horizontal=True)
+        write_mode = st.radio("W", ["标准写入", "流式写入 (省内存)"], horizontal=True)
+        # 紧凑内存：低基数文本列转分类、整数缩小位宽
+        mem_mode = st.radio("K", ["常规内存", "紧凑内存 (分类/整数压缩)"], horizontal=True)
+        # 超过每片行数 / 大小的组拆成 名称-part1、名称-part2…（xlsx 超过 Excel 行数上限时总会分片）
+        part_rows, part_mb = PART_OPTIONS[st.selectbox("PT", list(PART_OPTIONS))]
+        workers = st.selectbox("J", worker_choices(), format_func=lambda n: "ZIP 串行生成" if n == 1 else f"ZIP 并行生成: {n} 进程")
+        diag_mode = st.radio("D", ["诊断: 仅计时", "诊断: 计时 + 内存峰值 (较慢)"], horizontal=True)
+    return {"lazy": not read_mode.startswith("完整"), "reader": "calamine" if read_mode.startswith("快速") else "openpyxl",
+            "compact": mem_mode.startswith("紧凑"), "streaming": write_mode.startswith("流式"),
+            "part_rows": part_rows, "part_mb": part_mb, "workers": workers, "trace_memory": "内存" in diag_mode}
+
+
+# 分组结果缓存的类型名称
+MEMO_LABELS = {"unique": "分组去重", "index": "分组索引", "str_index": "汇总分组索引", "member": "ZIP 成员", "workbook": "单文件结果"}
+
+
+def show_diagnostics(summary):
+    """在可折叠面板中展示一次运行的诊断（summary 为 Diagnostics.summary() 的结果）"""
+    with st.expander("运行诊断"):
+        table = pd.DataFrame([{
+            "阶段": STAGE_LABELS.get(item["stage"], item["stage"]),
+            "次数": item["calls"],
+            "耗时 (s)": item["seconds"],
+            "行数": item["rows"],
+            "单元格": item["cells"],
+            "内存峰值 (MB)": item["peak_mb"],
+        } for item in summary["stages"]])
+        st.dataframe(table, hide_index=True)
+        if summary.get("files"):
+            # 批量分表：各文件的输出数量和耗时（合并时为读取耗时）
+            st.dataframe(pd.DataFrame([{"文件": item["file"], "输出": item.get("outputs"), "耗时 (s)": item["seconds"]}
+                                       for item in summary["files"]]), hide_index=True)
+        rss = f"，进程内存峰值 {summary['max_rss_mb']} MB" if summary.get("max_rss_mb") else ""
+        st.caption(f"分表耗时 {summary['total_seconds']:.2f} s{rss}；读取阶段在上传/选择 Sheet 时完成，不计入分表耗时")
+        cache = summary.get("parse_cache")
+        if cache:
+            st.caption(f"解析缓存：{cache['entries']} 个工作簿，{cache['mb']} / {cache['budget_mb']} MB，"
+                       f"命中 {cache['hits']}，未命中 {cache['misses']}，淘汰 {cache['evictions']}")
+        memo = summary.get("memo")
+        if memo:
+            st.caption("分组结果缓存：" + "，".join(
+                f"{MEMO_LABELS.get(kind, kind)} 命中 {item['hits']}/{item['hits'] + item['misses']}"
+                for kind, item in memo.items()))
+
+
+def result_data(res):
+    """download_button 的延迟数据：点击下载时才从磁盘读取文件"""
+    return functools.partial(read_file, res["path"])
+
+
+def show_result(column, label="💾 下载结果"):
+    """结果就绪时在 column 中显示下载按钮（点击时才从磁盘读取），并展示运行诊断"""
+    res = st.session_state.res
+    if result_ready(res):
+        column.download_button(label=label, data=result_data(res), file_name=res["name"], use_container_width=True)
+        show_diagnostics(res["diag"])
+
+
+# --- 后台分表任务 ---
+def job_active():
+    job = st.session_state.get("_job")
+    return bool(job) and job.active
+
+
+def start_split_job(res_name, diag, source=None, **split_args):
+    """把分表提交到共用线程池后台执行，结果写入会话临时目录
+
+    split_args 为 run_split 的参数（target / diag / progress / memo 除外）。
+    source 为工作簿的缓存键，给出时复用同一工作簿已生成的分组结果。
+    """
+    out_path = result_store().path(res_name)
+    memo = RunMemo(source) if source else None
+    total = count_outputs(split_args["sheet_data"], split_args["selected_sheets"], split_args["group_columns"],
+                          split_args["mode"], split_args.get("groups"), memo, split_args.get("part_rows"),
+                          split_args.get("part_mb"), split_args.get("fmt", "styled"))
+    diag.info["parse_cache"] = workbook_cache.stats()
+
+    def task(progress):
+        try:
+            diag.info["outputs"] = run_split(target=out_path, diag=diag, progress=progress, memo=memo, **split_args)
+        except BaseException:
+            # 取消或失败时删除写了一半的结果
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            raise
+        if memo:
+            diag.info["memo"] = memo.summary()
+        return {"path": out_path, "name": res_name, "diag": diag.log()}
+
+    st.session_state["_job"] = jobs.submit(task, total)
+    st.session_state["_job_reported"] = False
+
+
+def start_batch_job(res_name, diag, books, names, **batch_args):
+    """批量分表（见 batch.split_batch）提交到后台执行；总数在各文件读取后才知道，进度面板按文件显示状态
+
+    各文件的中间结果写在会话目录中，随会话目录一起清理。
+    """
+    out_path = result_store().path(res_name)
+    diag.info["parse_cache"] = workbook_cache.stats()
+    files = {name: {"status": "等待"} for name in file_stems(names)}
+
+    def report(stem, **fields):
+        files[stem].update(fields)
+
+    def task(progress):
+        try:
+            diag.info["outputs"] = split_batch(books, names, target=out_path, diag=diag, progress=progress,
+                                               report=report, tmp_dir=os.path.dirname(out_path), **batch_args)
+        except BaseException:
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            raise
+        return {"path": out_path, "name": res_name, "diag": diag.log()}
+
+    job = jobs.submit(task)
+    job.files = files
+    st.session_state["_job"] = job
+    st.session_state["_job_reported"] = False
+
+
+def show_job_progress():
+    """显示后台任务进度和取消按钮；任务结束后填入 st.session_state.res 并刷新整页"""
+    job = st.session_state.get("_job")
+    if job is None:
+        return
+
+    # 只在任务进行中定时刷新
+    @st.fragment(run_every=1.0 if job.active else None)
+    def panel():
+        if job.active:
+            if job.status == "queued":
+                st.progress(0.0, text=f"排队中，前面还有 {job.queue_position()} 个任务")
+            else:
+                eta = job.eta()
+                text = f"已完成 {job.done} / {job.total}" + (f"，预计还需 {eta:.0f} 秒" if eta is not None else "")
+                st.progress(min(job.done / job.total, 1.0) if job.total else 0.0, text=text)
+            if job.files:
+                st.dataframe(pd.DataFrame([{"文件": stem, "状态": item["status"],
+                                            "进度": f"{item['done']} / {item['total']}" if "total" in item else "",
+                                            "耗时 (s)": item.get("seconds")}
+                                           for stem, item in list(job.files.items())]), hide_index=True)
+            if st.button("取消", key="_job_cancel"):
+                job.cancel()
+            return
+        if not st.session_state.get("_job_reported"):
+            # 任务刚结束：整页重跑一次，停止定时刷新并显示下载按钮
+            st.session_state["_job_reported"] = True
+            if job.status == "done":
+                st.session_state.res = job.result
+                st.session_state.show_success = True
+            st.rerun()
+        if job.status == "failed":
+            st.error(f"分表失败: {job.error}")
+        elif job.status == "cancelled":
+            st.info("已取消分表")
+
+    panel()
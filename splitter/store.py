@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import time
+import weakref
+
+# 分表结果落盘目录；超过 TTL（秒）未更新的会话目录在下次创建会话时清理
+RESULT_ROOT = os.environ.get("SPLIT_RESULT_DIR", os.path.join(tempfile.gettempdir(), "excel-split-results"))
+RESULT_TTL = int(os.environ.get("SPLIT_RESULT_TTL", 2 * 3600))
+
+
+def sweep_expired(root=RESULT_ROOT, ttl=RESULT_TTL):
+    """删除超过 TTL 未更新的会话目录（会话异常结束、进程重启后遗留的结果）"""
+    now = time.time()
+    for entry in os.scandir(root):
+        try:
+            if entry.is_dir() and now - entry.stat().st_mtime > ttl:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+
+class ResultStore:
+    """每个会话一个临时目录，分表结果直接写到磁盘，不在内存里保留整份输出"""
+
+    def __init__(self, root=RESULT_ROOT, ttl=RESULT_TTL):
+        os.makedirs(root, exist_ok=True)
+        sweep_expired(root, ttl)
+        self.dir = tempfile.mkdtemp(prefix="session-", dir=root)
+        # 会话结束、对象被回收时删除整个目录
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.dir, True)
+
+    def path(self, file_name):
+        """新结果的落盘路径；同一会话只保留最新一份结果"""
+        os.makedirs(self.dir, exist_ok=True)
+        for entry in os.scandir(self.dir):
+            os.remove(entry.path)
+        os.utime(self.dir)
+        return os.path.join(self.dir, file_name)
+
+    def close(self):
+        self._finalizer()
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
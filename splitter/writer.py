@@ -0,0 +1,218 @@
+import importlib.util
+from contextlib import contextmanager
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils.dataframe import dataframe_to_rows
+
+from .diagnostics import Diagnostics
+
+# --- 共用样式（与 copy_format_and_write 的美化效果一致） ---
+HEADER_FONT = Font(bold=True)
+HEADER_FILL = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
+EVEN_FILL = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
+ODD_FILL = PatternFill(start_color="FFFFFF", end_color="FFFFFF", fill_type="solid")
+HEADER_ALIGN = Alignment(horizontal="center", vertical="center")
+BODY_ALIGN = Alignment(vertical="center")
+
+# 输出格式：styled = 保留原格式并美化；xlsx = 无样式工作簿；csv / parquet = 纯数据，每张表一个文件
+OUTPUT_FORMATS = ("styled", "xlsx", "csv", "parquet")
+FRAME_FORMATS = ("csv", "parquet")
+
+
+def parquet_available():
+    # Parquet 由 pandas 调用 pyarrow 写出，为可选依赖
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+@contextmanager
+def excel_book(fileobj, streaming=False, diag=None):
+    """打开一个待写出的工作簿；streaming=True 时使用 write_only 模式，行写入后即序列化"""
+    diag = diag or Diagnostics()
+    if streaming:
+        wb = Workbook(write_only=True)
+        yield wb
+        with diag.stage("save"):
+            wb.save(fileobj)
+    else:
+        writer = pd.ExcelWriter(fileobj, engine='openpyxl')
+        try:
+            yield writer.book
+        finally:
+            # 与 with pd.ExcelWriter 相同，退出时保存；单独计时以区分写单元格和序列化/压缩
+            with diag.stage("save"):
+                writer.close()
+
+
+def copy_format_and_write(new_ws, layout, group_df, diag=None):
+    """标准写入：逐单元格写值后再统一套用格式与斑马纹"""
+    diag = diag or Diagnostics()
+    with diag.stage("write.cells", rows=len(group_df), cells=group_df.size):
+        _write_values(new_ws, layout, group_df)
+    with diag.stage("write.styles", rows=len(group_df), cells=group_df.size):
+        _apply_styles(new_ws, layout, group_df)
+
+
+def _apply_sheet_format(ws, layout):
+    # layout 为读取时生成的格式概要（列宽、行高、按列的数字格式、冻结窗格），与行数无关，
+    # 数据行的统一行高设为工作表默认行高，不逐行设置
+    for col_letter, width in layout["col_widths"].items():
+        ws.column_dimensions[col_letter].width = width
+    if layout["header_height"] is not None:
+        ws.row_dimensions[1].height = layout["header_height"]
+    if layout["row_height"] is not None:
+        ws.sheet_format.defaultRowHeight = layout["row_height"]
+        ws.sheet_format.customHeight = True
+    if layout["freeze_panes"]:
+        ws.freeze_panes = layout["freeze_panes"]
+
+
+def _write_values(new_ws, layout, group_df):
+    _apply_sheet_format(new_ws, layout)
+    for r_idx, row in enumerate(dataframe_to_rows(group_df, index=False, header=True), 1):
+        for c_idx, value in enumerate(row, 1):
+            new_ws.cell(row=r_idx, column=c_idx, value=value)
+
+
+def _apply_styles(new_ws, layout, group_df):
+    # 一次遍历写入区域：表头套表头样式，数据行按列套数字格式并加斑马纹
+    # （new_ws[行号] 每次都要在全部单元格中查找该行，大组时是平方级的）
+    header_formats, col_formats = layout["header_formats"], layout["col_formats"]
+    total_rows, n_cols = len(group_df) + 1, group_df.shape[1]
+    if not n_cols:
+        return
+    for row_idx, row in enumerate(new_ws.iter_rows(min_row=1, max_row=total_rows, max_col=n_cols), 1):
+        if row_idx == 1:
+            for cell in row:
+                cell.font, cell.fill, cell.alignment = HEADER_FONT, HEADER_FILL, HEADER_ALIGN
+                if cell.column in header_formats:
+                    cell.number_format = header_formats[cell.column]
+            continue
+        fill = EVEN_FILL if (row_idx % 2 == 0) else ODD_FILL
+        for cell in row:
+            cell.fill, cell.alignment = fill, BODY_ALIGN
+            if cell.column in col_formats:
+                cell.number_format = col_formats[cell.column]
+
+
+class _StyledCells:
+    """按 (行类型, 数字格式) 缓存的样式模板，每个单元格直接复用模板的样式数组
+
+    cell._style 是 openpyxl 的内部属性，依赖 requirements.txt 中固定的 3.1.x 版本。
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._templates = {}
+
+    def _template(self, kind, number_format):
+        key = (kind, number_format)
+        if key not in self._templates:
+            cell = WriteOnlyCell(self.ws)
+            if kind == "header":
+                cell.font, cell.fill, cell.alignment = HEADER_FONT, HEADER_FILL, HEADER_ALIGN
+            elif kind in ("even", "odd"):
+                cell.fill, cell.alignment = (EVEN_FILL if kind == "even" else ODD_FILL), BODY_ALIGN
+            cell.number_format = number_format
+            self._templates[key] = cell._style
+        return self._templates[key]
+
+    def cell(self, kind, number_format, value=None):
+        cell = WriteOnlyCell(self.ws, value=value)
+        cell._style = self._template(kind, number_format)
+        return cell
+
+
+def write_group_stream(ws, layout, group_df, diag=None):
+    """copy_format_and_write 的 write_only 版本：按行流式写出已带样式的单元格
+
+    列宽、行高、冻结窗格必须在写第一行之前设置，所以先处理格式再逐行 append。
+    样式随单元格一起写出，诊断中只有 write.cells 阶段。
+    """
+    diag = diag or Diagnostics()
+    with diag.stage("write.cells", rows=len(group_df), cells=group_df.size):
+        _append_styled_rows(ws, layout, group_df)
+
+
+def _append_styled_rows(ws, layout, group_df):
+    _apply_sheet_format(ws, layout)
+    header_formats, col_formats = layout["header_formats"], layout["col_formats"]
+    cells = _StyledCells(ws)
+    for r_idx, row in enumerate(dataframe_to_rows(group_df, index=False, header=True), 1):
+        kind = "header" if r_idx == 1 else ("even" if r_idx % 2 == 0 else "odd")
+        fmts = header_formats if r_idx == 1 else col_formats
+        ws.append([cells.cell(kind, fmts.get(c_idx, 'General'), value) for c_idx, value in enumerate(row, 1)])
+
+
+# --- 无样式输出 ---
+def write_plain_sheet(ws, layout, group_df, diag=None):
+    """无样式写入：只按行写值，不设置列宽、数字格式和填充（ws 为 write_only 工作表，layout 不使用）"""
+    diag = diag or Diagnostics()
+    with diag.stage("write.cells", rows=len(group_df), cells=group_df.size):
+        for row in dataframe_to_rows(group_df, index=False, header=True):
+            ws.append(row)
+
+
+def _unique_columns(columns):
+    # Parquet 要求列名是互不相同的字符串
+    names, seen = [], set()
+    for col in columns:
+        name = base = "" if col is None else str(col)
+        n = 0
+        while name in seen:
+            n += 1
+            name = f"{base}.{n}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _parquet_frame(df):
+    import pyarrow as pa
+
+    columns = []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if col.dtype == object:
+            try:
+                pa.array(col, from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # 同一列混有数字和文本等类型时 Parquet 无法存储，转为文本（空值保持为空）
+                col = col.map(lambda v: v if v is None or v != v else str(v))
+        columns.append(col)
+    out = pd.concat(columns, axis=1, ignore_index=True)
+    out.columns = _unique_columns(df.columns)
+    return out
+
+
+def frame_bytes(df, fmt, diag=None):
+    """一张表导出为 CSV（带 BOM，Excel 直接打开中文不乱码）或 Parquet，返回字节"""
+    diag = diag or Diagnostics()
+    with diag.stage("export", rows=len(df), cells=df.size):
+        if fmt == "csv":
+            return df.to_csv(index=False).encode("utf-8-sig")
+        buf = BytesIO()
+        _parquet_frame(df).to_parquet(buf, index=False)
+        return buf.getvalue()
+
+
+def render_workbook(sheets, streaming=False, diag=None, fmt="styled"):
+    """把若干 (sheet 名, layout, DataFrame) 写成一个独立的 xlsx，返回字节
+
+    fmt 为 csv / parquet 时 sheets 只能有一张表，返回对应格式的字节；
+    fmt="xlsx" 时不套用任何样式，按行流式写出。
+    """
+    if fmt in FRAME_FORMATS:
+        return frame_bytes(sheets[0][2], fmt, diag)
+    if fmt == "xlsx":
+        write_sheet, streaming = write_plain_sheet, True
+    else:
+        write_sheet = write_group_stream if streaming else copy_format_and_write
+    buf = BytesIO()
+    with excel_book(buf, streaming, diag) as out_book:
+        for title, layout, df in sheets:
+            write_sheet(out_book.create_sheet(title=title), layout, df, diag)
+    return buf.getvalue()